@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright (C) [2021] [Joseph Zakar], [observing@gmail.com]
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+Times the stages of the extruder on generated shapes: regular n-gons, stars,
+plates with many cutouts and rows of block letters standing in for text that
+was converted to paths. The geometry library (extrudergeom) is timed on its
+own as well, without an SVG document.
+
+    python bench_extruderz.py [--quick] [--repeat N] [--output results.json]
+    python bench_extruderz.py --compare before.json after.json
+
+Results are written as JSON (to stdout unless --output is given), tagged with
+the git commit, so runs on different commits can be compared.
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extrudergeom
+import extruderz
+from extruderz import Extruder
+
+SVG_TEMPLATE = '''<svg xmlns="http://www.w3.org/2000/svg"
+  xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+  width="100in" height="100in" viewBox="0 0 9600 9600">
+<g inkscape:groupmode="layer" id="layer1">
+<path id="bench" d="{0}" style="fill:none;stroke:#000000;stroke-width:1"/>
+</g></svg>'''
+
+# Shape generators. Each returns a list of closed polygons (lists of points)
+# drawn as the subpaths of one path, with about nverts vertices in all.
+
+def ngon(nverts, radius=300.0, cx=400.0, cy=400.0):
+    return [[(cx+radius*math.cos(2*math.pi*i/nverts+0.1), cy+radius*math.sin(2*math.pi*i/nverts+0.1))\
+        for i in range(nverts)]]
+
+def star(nverts, radius=300.0, cx=400.0, cy=400.0):
+    npoints = max(3, nverts//2)
+    pts = []
+    for i in range(2*npoints):
+        r = radius if i % 2 == 0 else radius*0.45
+        a = math.pi*i/npoints + 0.1
+        pts.append((cx+r*math.cos(a), cy+r*math.sin(a)))
+    return [pts]
+
+def cutouts(nverts, size=800.0):
+    # A square plate with a grid of small square holes
+    nholes = max(1, (nverts-4)//4)
+    side = int(math.ceil(math.sqrt(nholes)))
+    pitch = size/(side+1)
+    hole = pitch*0.4
+    polys = [[(0.0,0.0), (size,0.0), (size,size), (0.0,size)]]
+    for i in range(nholes):
+        x = pitch*(1+i % side) - hole/2
+        y = pitch*(1+i//side) - hole/2
+        polys.append([(x,y), (x,y+hole), (x+hole,y+hole), (x+hole,y)])
+    return polys
+
+def text(nverts, height=200.0):
+    # A row of block letters 'O', 'E' and 'A' like glyphs, each an outline with
+    # bevelled corners plus counters where the letter has them
+    polys = []
+    x = 0.0
+    width = height*0.7
+    bevel = height*0.1
+    stroke = height*0.18
+    letter = 0
+    while sum(len(p) for p in polys) < nverts:
+        kind = letter % 3
+        if kind == 1: # E: an outline with two notches
+            polys.append([(x,0.0), (x+width,0.0), (x+width,stroke), (x+stroke,stroke),\
+                (x+stroke,height/2-stroke/2), (x+width*0.8,height/2-stroke/2), (x+width*0.8,height/2+stroke/2),\
+                (x+stroke,height/2+stroke/2), (x+stroke,height-stroke), (x+width,height-stroke),\
+                (x+width,height), (x,height)])
+        else: # O and A: a bevelled outline with a counter
+            polys.append([(x+bevel,0.0), (x+width-bevel,0.0), (x+width,bevel), (x+width,height-bevel),\
+                (x+width-bevel,height), (x+bevel,height), (x,height-bevel), (x,bevel)])
+            top = height*0.6 if kind == 2 else height-stroke
+            polys.append([(x+stroke,stroke), (x+stroke,top), (x+width-stroke,top), (x+width-stroke,stroke)])
+        x = x + width*1.2
+        letter += 1
+    return polys
+
+SHAPES = {'ngon': ngon, 'star': star, 'cutouts': cutouts, 'text': text}
+
+def pathData(polys):
+    return " ".join("M " + " L ".join("{0:.4f},{1:.4f}".format(*p) for p in poly) + " Z" for poly in polys)
+
+def best(func, repeat):
+    # The fastest of repeat runs, in seconds
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def benchEffect(polys, args, repeat):
+    # Times the whole effect and, separately, writing out the document
+    data = SVG_TEMPLATE.format(pathData(polys)).encode('utf-8')
+    def setup():
+        ext = Extruder()
+        ext.parse_arguments(args + ['--id=bench'])
+        ext.options.input_file = io.BytesIO(data)
+        ext.load_raw()
+        return ext
+    effect_times = []
+    save_times = []
+    for _ in range(repeat):
+        ext = setup()
+        start = time.perf_counter()
+        ext.effect()
+        effect_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        ext.save(io.BytesIO())
+        save_times.append(time.perf_counter() - start)
+    return min(effect_times), min(save_times)
+
+def benchMakeTab(nverts, solver, repeat):
+    # Tabs along a strip like the ones effect builds: nverts segments of
+    # varying length down the left side and back up the right. The analytic
+    # solver is extrudergeom.makeTabs, as effect calls it; the iterative one
+    # fits the tabs one edge at a time through Extruder.makeTabs
+    ext = Extruder()
+    ext.parse_arguments(['--tabsolver='+solver])
+    ypos = [0.0]
+    for i in range(nverts):
+        ypos.append(ypos[-1] + (10.0 if i % 3 == 0 else 60.0))
+    outline = extrudergeom.stripOutline(ypos, 96.0)
+    if solver == 'analytic':
+        run = lambda: extrudergeom.makeTabs(outline, 38.4, 45.0)
+    else:
+        run = lambda: ext.makeTabs(outline, 38.4, 45.0)
+    return best(run, repeat)
+
+def benchScoreSegments(length, dashlength, repeat):
+    # Score lines across, down and at an angle, with dashlength dashes
+    lines = [(0.0, 0.0, length, 0.0), (0.0, 0.0, 0.0, length), (0.0, 0.0, length*0.6, length*0.8)]
+    def run():
+        for x1, y1, x2, y2 in lines:
+            extrudergeom.scoreSegments(x1, y1, x2, y2, dashlength)
+    return best(run, repeat)
+
+def benchPolygonInPolygon(nverts, repeat):
+    # One n-gon inside another, with the polygons built afresh on every run
+    # as they are for a newly selected path
+    outer = ngon(nverts, 300.0)[0]
+    inner = ngon(nverts, 150.0)[0]
+    def run():
+        extrudergeom.polygonInPolygon(extrudergeom.pnPolygon(outer), extrudergeom.pnPolygon(inner))
+    return best(run, repeat)
+
+def benchExtrudeRing(polys, dashlength, maxstrip, repeat):
+    # The library on its own: every subpath extruded as an outline, with the
+    # settings of benchEffect in user units (96 to the inch)
+    def run():
+        for ring in polys:
+            extrudergeom.extrudeRing(ring, extrude=96.0, maxstrip=maxstrip*96.0, tabheight=0.4*96.0,\
+                dashlength=dashlength*96.0, native=True)
+    return best(run, repeat)
+
+def gitCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],\
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def runBenchmarks(quick, repeat):
+    vertex_counts = [16, 64] if quick else [16, 64, 256, 1024]
+    dashlengths = [0.0, 0.1] if quick else [0.0, 0.05, 0.1]
+    maxstrips = [11.5] if quick else [4.0, 11.5]
+    results = []
+    def record(stage, seconds, **params):
+        params['stage'] = stage
+        params['seconds'] = seconds
+        results.append(params)
+        print("{0:<16} {1:<60} {2:10.5f}s".format(stage,\
+            " ".join("{0}={1}".format(k, v) for k, v in params.items() if k not in ('stage', 'seconds')), seconds),\
+            file=sys.stderr)
+    for shape, gen in SHAPES.items():
+        for nverts in vertex_counts:
+            polys = gen(nverts)
+            for dashlength in dashlengths:
+                for maxstrip in maxstrips:
+                    args = ['--unit=in', '--dashlength={0}'.format(dashlength), '--maxstrip={0}'.format(maxstrip)]
+                    effect, save = benchEffect(polys, args, repeat)
+                    params = dict(shape=shape, vertices=sum(len(p) for p in polys), subpaths=len(polys),\
+                        dashlength=dashlength, maxstrip=maxstrip)
+                    record('effect', effect, **params)
+                    record('save', save, **params)
+                    record('extrudeRing', benchExtrudeRing(polys, dashlength, maxstrip, repeat), **params)
+    for nverts in vertex_counts:
+        for solver in ['analytic', 'iterative']:
+            record('makeTab', benchMakeTab(nverts, solver, repeat), vertices=nverts, solver=solver)
+        record('polygonInPolygon', benchPolygonInPolygon(nverts, repeat), vertices=nverts)
+    for length in [96.0, 960.0]:
+        for dashlength in [1.0, 4.8, 9.6]:
+            record('scoreSegments', benchScoreSegments(length, dashlength, repeat), length=length, dashlength=dashlength)
+    return results
+
+def resultKey(result):
+    return tuple(sorted((k, v) for k, v in result.items() if k != 'seconds'))
+
+def compare(before_file, after_file):
+    # Prints the speedup of every benchmark found in both runs
+    with open(before_file) as fp:
+        before = json.load(fp)
+    with open(after_file) as fp:
+        after = json.load(fp)
+    times = {resultKey(r): r['seconds'] for r in before['results']}
+    print("{0} -> {1}".format(before.get('commit'), after.get('commit')))
+    for result in after['results']:
+        key = resultKey(result)
+        if key in times and result['seconds'] > 0.0:
+            print("{0:<80} {1:10.5f}s {2:10.5f}s {3:7.2f}x".format(\
+                " ".join("{0}={1}".format(k, v) for k, v in key), times[key], result['seconds'], times[key]/result['seconds']))
+
+def main(argv=None):
+    pars = argparse.ArgumentParser(description="Benchmark the extruder stages")
+    pars.add_argument("--quick", action="store_true", help="Fewer and smaller cases")
+    pars.add_argument("--repeat", type=int, default=3, help="Runs per case (the fastest is kept)")
+    pars.add_argument("--output", help="Write the JSON results to this file")
+    pars.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files")
+    options = pars.parse_args(argv)
+    if options.compare:
+        compare(*options.compare)
+        return 0
+    report = {
+        'commit': gitCommit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'extruderz': os.path.abspath(extruderz.__file__),
+        'repeat': options.repeat,
+        'results': runBenchmarks(options.quick, options.repeat),
+    }
+    if options.output:
+        with open(options.output, 'w') as fp:
+            json.dump(report, fp, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright (C) [2021] [Joseph Zakar], [observing@gmail.com]
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+Times how long the extruder takes to get going when, as in Inkscape, every
+run is a new Python process:
+
+    python          starting Python and doing nothing (for reference)
+    import          importing extruderz, and with it inkex
+    nothing         a run with nothing selected, until it has aborted
+    first-output    a run on one small path, until the first byte of output
+    finished        the same run, until the process has exited
+
+    python bench_startup.py [--repeat N] [--output results.json]
+        [--import-budget SECONDS] [--first-output-budget SECONDS]
+
+Each time is the fastest of --repeat runs. Results are written as JSON in
+the form bench_extruderz.py writes, so its --compare works on them too.
+
+The import and first-output times are held to budgets, counted over the
+time Python itself takes to start, so that they measure the extruder and
+not the machine's Python: 0.5s for the import and 0.75s for the first
+output unless set otherwise (0 turns a check off). The run fails (exit
+status 1) when either one is over.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BETA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(BETA, 'extruderz_run.py') # what Inkscape runs
+
+SVG = '''<svg xmlns="http://www.w3.org/2000/svg"
+  xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+  width="8.5in" height="11in" viewBox="0 0 816 1056">
+<g inkscape:groupmode="layer" id="layer1">
+<path id="p1" d="M 100,100 L 300,100 L 300,250 L 200,320 L 100,250 Z" style="fill:none;stroke:#000000;stroke-width:1"/>
+</g></svg>'''
+
+def timeProcess(args):
+    # Seconds from starting the process to its first byte of output, and to
+    # its exit
+    start = time.perf_counter()
+    proc = subprocess.Popen(args, cwd=BETA, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    proc.stdout.read(1)
+    first = time.perf_counter() - start
+    proc.stdout.read()
+    proc.wait()
+    return first, time.perf_counter() - start
+
+def gitCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],\
+            cwd=BETA, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def runBenchmarks(repeat):
+    results = []
+    def record(stage, times):
+        results.append({'stage': stage, 'seconds': min(times)})
+        print("{0:<16} {1:10.5f}s".format(stage, min(times)), file=sys.stderr)
+    with tempfile.TemporaryDirectory() as folder:
+        svgfile = os.path.join(folder, 'startup.svg')
+        with open(svgfile, 'w') as fp:
+            fp.write(SVG)
+        runs = {
+            'python': [sys.executable, '-c', 'pass'],
+            'import': [sys.executable, '-c', 'import extruderz'],
+            'nothing': [sys.executable, SCRIPT, svgfile],
+            'output': [sys.executable, SCRIPT, '--id=p1', svgfile],
+        }
+        # The cases take turns, so that a slow spell of the machine doesn't
+        # fall on just one of them
+        times = {stage: [] for stage in runs}
+        for _ in range(repeat):
+            for stage, args in runs.items():
+                times[stage].append(timeProcess(args))
+    record('python', [end for first, end in times['python']])
+    record('import', [end for first, end in times['import']])
+    record('nothing', [end for first, end in times['nothing']])
+    record('first-output', [first for first, end in times['output']])
+    record('finished', [end for first, end in times['output']])
+    return results
+
+def overBudget(results, budgets):
+    # The stages that took longer than their budget, counted over the time
+    # of the python stage, as (stage, seconds over python, budget)
+    seconds = {result['stage']: result['seconds'] for result in results}
+    over = []
+    for stage, budget in budgets.items():
+        extra = seconds[stage] - seconds['python']
+        if (budget > 0.0) and (extra > budget):
+            over.append((stage, extra, budget))
+    return over
+
+def main(argv=None):
+    pars = argparse.ArgumentParser(description="Benchmark the extruder's startup")
+    pars.add_argument("--repeat", type=int, default=10, help="Runs per case (the fastest is kept)")
+    pars.add_argument("--output", help="Write the JSON results to this file")
+    pars.add_argument("--import-budget", type=float, default=0.5,\
+        help="Most seconds the import may take over starting Python (0 for no check)")
+    pars.add_argument("--first-output-budget", type=float, default=0.75,\
+        help="Most seconds to the first output over starting Python (0 for no check)")
+    options = pars.parse_args(argv)
+    budgets = {'import': options.import_budget, 'first-output': options.first_output_budget}
+    results = runBenchmarks(options.repeat)
+    over = overBudget(results, budgets)
+    report = {
+        'commit': gitCommit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'extruderz': SCRIPT,
+        'repeat': options.repeat,
+        'budgets': budgets,
+        'overbudget': [stage for stage, extra, budget in over],
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as fp:
+            json.dump(report, fp, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    for stage, extra, budget in over:
+        print("{0} took {1:.5f}s over starting Python, more than its budget of {2:.5f}s".format(stage, extra, budget),\
+            file=sys.stderr)
+    return 1 if len(over) > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
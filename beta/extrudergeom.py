@@ -0,0 +1,612 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright (C) [2021] [Joseph Zakar], [observing@gmail.com]
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+The geometry of the extruder as plain functions on coordinate arrays: strips
+laid out from a closed polygon, the tabs along them, score lines, cutout
+nesting, curve flattening and simplification. Only numpy is needed, so it can
+be used without inkex or an SVG document:
+
+    import extrudergeom
+    start, strips = extrudergeom.extrudeRing([(0,0), (96,0), (96,48), (0,48)],
+        extrude=96.0, maxstrip=1104.0, tabheight=38.4, dashlength=9.6)
+
+Lengths are in whatever units the coordinates are in. Points are (n,2)
+arrays, and segments (score lines, tab points) are (n,4) arrays of
+[x1,y1,x2,y2] rows. The functions that take counters add the work they do
+to it, when it is a dict.
+"""
+
+import math
+import numpy as np
+
+def addCount(counters, counter, n=1):
+    if counters is not None:
+        counters[counter] = counters.get(counter, 0) + n
+
+class pnPoint(object):
+   # This class came from https://github.com/JoJocoder/PNPOLY
+    def __init__(self,p):
+        self.p=p
+    def __str__(self):
+        return self.p
+    def InPolygon(self,polygon,BoundCheck=False):
+        inside=False
+        if BoundCheck:
+            minX=polygon[0][0]
+            maxX=polygon[0][0]
+            minY=polygon[0][1]
+            maxY=polygon[0][1]
+            for p in polygon:
+                minX=min(p[0],minX)
+                maxX=max(p[0],maxX)
+                minY=min(p[1],minY)
+                maxY=max(p[1],maxY)
+            if self.p[0]<minX or self.p[0]>maxX or self.p[1]<minY or self.p[1]>maxY:
+                return False
+        j=len(polygon)-1
+        for i in range(len(polygon)):
+            if ((polygon[i][1]>self.p[1])!=(polygon[j][1]>self.p[1]) and (self.p[0]<(polygon[j][0]-polygon[i][0])*(self.p[1]-polygon[i][1])/( polygon[j][1] - polygon[i][1] ) + polygon[i][0])):
+                    inside =not inside
+            j=i
+        return inside
+
+class pnPolygon(object):
+    # Precomputed form of a polygon for repeated pnPoints tests: vertex arrays,
+    # bounding box and the inverse slope of every edge
+    def __init__(self,polygon):
+        poly=np.asarray(polygon,dtype=float).reshape(-1,2)
+        self.count=len(poly)
+        self.x=poly[:,0]
+        self.y=poly[:,1]
+        # edge i runs from vertex j=i-1 to vertex i, as in pnPoint
+        self.xj=np.roll(self.x,1)
+        self.yj=np.roll(self.y,1)
+        if self.count>0:
+            self.minX,self.minY=poly.min(axis=0)
+            self.maxX,self.maxY=poly.max(axis=0)
+        # horizontal edges never pass the crossing test, so their slope is unused
+        dy=self.yj-self.y
+        flat=(dy==0)
+        self.slope=np.where(flat,0.0,(self.xj-self.x)/np.where(flat,1.0,dy))
+        # signed (shoelace) area
+        self.area=0.5*float(np.sum(self.xj*self.y-self.x*self.yj))
+    @classmethod
+    def fromPath(cls,path):
+        # Builds the polygon from a Path of M/L/Z commands (anything with
+        # letter, x and y on its commands will do)
+        pverts=[]
+        for pnum in path:
+            if pnum.letter=='Z':
+                pverts.append((path[0].x,path[0].y))
+            else:
+                pverts.append((pnum.x,pnum.y))
+        poly=cls(pverts)
+        poly.count=len(path)
+        return poly
+
+class pnPoints(object):
+    # Vectorized form of pnPoint: tests an array of points against a polygon
+    # in one pass instead of looping over the points one at a time
+    def __init__(self,p):
+        self.p=np.asarray(p,dtype=float).reshape(-1,2)
+    def __str__(self):
+        return str(self.p)
+    def InPolygon(self,polygon,BoundCheck=False):
+        # polygon is a pnPolygon or a sequence of vertices
+        # returns a boolean array with one entry per point
+        if not isinstance(polygon,pnPolygon):
+            polygon=pnPolygon(polygon)
+        px=self.p[:,0]
+        py=self.p[:,1]
+        inside=np.zeros(len(self.p),dtype=bool)
+        if polygon.count==0 or len(self.p)==0:
+            return inside
+        test=np.ones(len(self.p),dtype=bool)
+        if BoundCheck:
+            test=(px>=polygon.minX)&(px<=polygon.maxX)&(py>=polygon.minY)&(py<=polygon.maxY)
+        tx=px[test][:,None]
+        ty=py[test][:,None]
+        crosses=((polygon.y>ty)!=(polygon.yj>ty)) & (tx<polygon.slope*(ty-polygon.y)+polygon.x)
+        inside[test]=(np.count_nonzero(crosses,axis=1)%2)==1
+        return inside
+
+def polygonInPolygon(polygon, testpolygon, counters=None):
+    # Whether every corner of testpolygon is inside polygon (both pnPolygons)
+    addCount(counters, 'polygonInPolygon calls')
+    points = pnPoints(np.column_stack((testpolygon.x, testpolygon.y)))
+    return bool(points.InPolygon(polygon, True).all())
+
+def nestPolygons(polygons, counters=None):
+    # The containment tree of the subpaths of a path, given as pnPolygons. A
+    # subpath's parent is the smallest subpath that fully encloses it. Cutouts
+    # sit at odd depths, so an island inside a cutout is extruded as an outline
+    # again. Returns the index of the parent (or None) and the depth of each
+    order = sorted(range(len(polygons)), key=lambda i: abs(polygons[i].area), reverse=True)
+    parents = [None]*len(polygons)
+    depths = [0]*len(polygons)
+    for i in range(len(order)):
+        apoly = polygons[order[i]]
+        # Candidates are larger, so the first one that encloses apoly
+        # (searching from the smallest) is its parent
+        for b in reversed(order[:i]):
+            bpoly = polygons[b]
+            if (apoly.minX < bpoly.minX) or (apoly.maxX > bpoly.maxX) or \
+               (apoly.minY < bpoly.minY) or (apoly.maxY > bpoly.maxY):
+                continue
+            if polygonInPolygon(bpoly, apoly, counters):
+                parents[order[i]] = b
+                depths[order[i]] = depths[b] + 1
+                break
+    return parents, depths
+
+def transformPoints(points, matrix):
+    # Applies an affine transform, given as ((a, c, e), (b, d, f)), to an
+    # (n,2) array of points in one pass
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    (a, c, e), (b, d, f) = matrix
+    x = points[:,0]
+    y = points[:,1]
+    return np.column_stack((a*x + c*y + e, b*x + d*y + f))
+
+def transformScale(matrix):
+    # How much an affine transform scales lengths, on average over all
+    # directions: the square root of its determinant (the exact factor when
+    # it scales evenly). Stroke widths are scaled by this.
+    (a, c, e), (b, d, f) = matrix
+    return math.sqrt(abs(a*d - b*c))
+
+def makeDashes(x1, y1, x2, y2, dashlength):
+    # Works out all the dashes of a dashed line between two points at once
+    # Dash = dashlength space followed by dashlength mark
+    # if dashlength is zero, we want a solid line
+    # Returns an array with one [x1,y1,x2,y2] row per dash
+    if math.isclose(dashlength, 0.0):
+        return np.array([[x1,y1,x2,y2]])
+    # Each case sets the starting point, the step for a space or a mark
+    # and a test for whether another dash fits after a given point
+    if math.isclose(y1, y2):
+        # horizontal
+        if x1 < x2:
+            xcushion = x2 - dashlength
+            start = (x1, y1)
+        else:
+            xcushion = x1 - dashlength
+            start = (x2, y2)
+        step = (dashlength, 0.0)
+        fits = lambda xpt, ypt: (xpt + dashlength*2) <= xcushion
+    elif math.isclose(x1, x2):
+        # vertical
+        if y1 < y2:
+            ycushion = y2 - dashlength
+            start = (x1, y1)
+        else:
+            ycushion = y1 - dashlength
+            start = (x2, y2)
+        step = (0.0, dashlength)
+        fits = lambda xpt, ypt: (ypt + dashlength*2) <= ycushion
+    else:
+        # sloping
+        if y1 > y2:
+            ax1, ay1, ax2, ay2 = x1, y1, x2, y2
+        else:
+            ax1, ay1, ax2, ay2 = x2, y2, x1, y1
+        m = (ay1-ay2)/(ax1-ax2)
+        theta = math.atan(m)
+        msign = (m>0) - (m<0)
+        ycushion = ay2 + dashlength*math.sin(theta)
+        xcushion = ax2 + msign*dashlength*math.cos(theta)
+        start = (ax1, ay1)
+        step = (-(msign*dashlength*math.cos(theta)), -(msign*dashlength*math.sin(theta)))
+        nydist = dashlength*2*math.sin(theta)
+        nxdist = msign*dashlength*2*math.cos(theta)
+        fits = lambda xpt, ypt: ((ypt - nydist) >= ycushion) & \
+            (((m<0) & ((xpt - nxdist) <= xcushion)) | ((m>0) & ((xpt - nxdist) >= xcushion)))
+    # Every dash uses up 2*dashlength of the line, which bounds the dash count
+    seglength = math.sqrt((x1-x2)**2 + (y1-y2)**2)
+    ndash = int(seglength/(dashlength*2)) + 2
+    while True:
+        # Accumulating the steps adds them in the same order as stepping
+        # along the line one dash at a time, so the points come out the same
+        steps = np.empty((2*ndash+1, 2))
+        steps[0] = start
+        steps[1:] = step
+        pts = np.add.accumulate(steps, axis=0)
+        # pts[2k] is where dash k's space starts
+        ok = fits(pts[0:-1:2,0], pts[0:-1:2,1])
+        if not ok.all():
+            break
+        ndash = ndash*2
+    ndash = int(np.argmin(ok))
+    return np.column_stack((pts[1:2*ndash:2], pts[2:2*ndash+1:2]))
+
+def scoreSegments(x1, y1, x2, y2, dashlength, native=False):
+    # The score line between two points as an array of [x1,y1,x2,y2] segments
+    # If native is set, the dashes are left to stroke-dasharray and only the
+    # line from the start of the first dash to the end of the last is drawn
+    dashes = makeDashes(x1, y1, x2, y2, dashlength)
+    if native and (len(dashes) > 1):
+        return np.array([[dashes[0,0], dashes[0,1], dashes[-1,2], dashes[-1,3]]])
+    return dashes
+
+def edgeScores(outline, dashlength, native=False):
+    # Score lines along every edge of a polygon but the closing one
+    pts = np.asarray(outline, dtype=float).tolist()
+    scores = [scoreSegments(x1, y1, x2, y2, dashlength, native) for (x1,y1),(x2,y2) in zip(pts[:-1],pts[1:])]
+    return np.vstack([np.empty((0,4))] + scores)
+
+def solveTabs(seglength, tabht, taba, counters=None):
+    # The height and angle of the tab on each edge of the given lengths. The
+    # sides of a tab of height h and angle a meet when h/tan(a) reaches half
+    # the edge length. Where they would, the smallest angle that fits is used
+    # (up to 88 degrees) or, failing that, the largest height that fits at the
+    # requested angle. Returns arrays of tab heights and angles, and of the
+    # offset of the tab points along each edge
+    halfseg = seglength/2.0
+    along = tabht/math.tan(math.radians(taba))
+    fits = along < halfseg
+    fitAngle = np.degrees(np.arctan2(tabht, halfseg))
+    useAngle = (~fits) & (fitAngle <= 88.0)
+    height = np.where(fits | useAngle, tabht, halfseg*math.tan(math.radians(taba)))
+    angle = np.where(useAngle, fitAngle, taba)
+    alongs = np.full(len(seglength), along)
+    alongs[~fits] = height[~fits]/np.tan(np.radians(angle[~fits]))
+    addCount(counters, 'tab adjustments', int(np.count_nonzero(~fits)))
+    return height, angle, alongs
+
+def makeTabs(outline, tabht, taba, enclosed=False, counters=None):
+    # Tabs for every edge of a polygon but the closing one, all at once.
+    # outline is an (n,2) array of the polygon's corners. The tabs go on the
+    # outside, or the inside when enclosed is set.
+    # Returns an (n-1,4) array of the two tab points of each edge
+    addCount(counters, 'makeTab calls', len(outline)-1)
+    pt1 = outline[:-1]
+    pt2 = outline[1:]
+    delta = pt2 - pt1
+    seglength = np.sqrt(delta[:,0]**2 + delta[:,1]**2)
+    unit = delta/np.where(seglength == 0.0, 1.0, seglength)[:,None]
+    # The outward side of every edge of a polygon with positive (shoelace)
+    # area is the one where the cross product of the edge with the tab
+    # direction is negative, and the other way round for negative area
+    outSide = -1 if pnPolygon(outline).area > 0.0 else 1
+    if enclosed:
+        outSide = -outSide
+    normal = -outSide*np.column_stack((unit[:,1], -unit[:,0]))
+    height, angle, along = solveTabs(seglength, tabht, taba, counters)
+    tpt1 = pt1 + height[:,None]*normal + along[:,None]*unit
+    tpt2 = pt2 + height[:,None]*normal - along[:,None]*unit
+    return np.column_stack((tpt1, tpt2))
+
+def segmentsCross(s, t, eps):
+    # Whether each segment in s crosses the one in the same row of t (both
+    # (n,4) arrays). Just touching, at an end or along a line (as mitred tabs
+    # in a corner do), isn't crossing.
+    def side(seg, px, py):
+        return (seg[:,2]-seg[:,0])*(py-seg[:,1]) - (seg[:,3]-seg[:,1])*(px-seg[:,0])
+    tol = eps*np.maximum(1.0, np.maximum(np.hypot(s[:,2]-s[:,0], s[:,3]-s[:,1]),\
+        np.hypot(t[:,2]-t[:,0], t[:,3]-t[:,1])))
+    d1 = side(t, s[:,0], s[:,1])
+    d2 = side(t, s[:,2], s[:,3])
+    d3 = side(s, t[:,0], t[:,1])
+    d4 = side(s, t[:,2], t[:,3])
+    return (((d1 > tol) & (d2 < -tol)) | ((d1 < -tol) & (d2 > tol))) &\
+        (((d3 > tol) & (d4 < -tol)) | ((d3 < -tol) & (d4 > tol)))
+
+def tabsApart(outline, tabs):
+    # A quick check that no tab can collide: true when the polygon is a
+    # rectangle with its sides along the axes (as every strip is) and each
+    # tab stays beside its own edge, on the outside. Tabs beside different
+    # edges of such a rectangle can at most touch.
+    if len(tabs) != len(outline) - 1:
+        return False
+    lo = outline.min(axis=0)
+    hi = outline.max(axis=0)
+    eps = 1e-9*max(1.0, float(np.abs(outline).max()))
+    pt1 = outline[:-1]
+    pt2 = outline[1:]
+    vertical = np.abs(pt2[:,0] - pt1[:,0]) <= eps
+    if not (vertical | (np.abs(pt2[:,1] - pt1[:,1]) <= eps)).all():
+        return False
+    onside = (np.abs(outline - lo) <= eps) | (np.abs(outline - hi) <= eps)
+    if not onside.any(axis=1).all() or\
+            not math.isclose(abs(pnPolygon(outline).area), float(np.prod(hi - lo)), rel_tol=1e-9):
+        return False # not the rectangle itself
+    # Along and across each edge: y and x for a vertical edge, x and y for
+    # a horizontal one
+    a = np.where(vertical, 1, 0)
+    idx = np.arange(len(tabs))
+    along = np.column_stack((tabs[idx,a], tabs[idx,2+a]))
+    across = np.column_stack((tabs[idx,1-a], tabs[idx,3-a]))
+    alo = np.minimum(pt1[idx,a], pt2[idx,a])[:,None]
+    ahi = np.maximum(pt1[idx,a], pt2[idx,a])[:,None]
+    edge = pt1[idx,1-a][:,None]
+    outward = np.where(np.abs(edge - lo[1-a][:,None]) <= eps, across <= edge + eps, across >= edge - eps)
+    return bool(((along >= alo - eps) & (along <= ahi + eps) & outward).all())
+
+def tabCollisions(outline, tabs):
+    # Sweep and prune over the sides of all the tabs on a polygon and the
+    # polygon's own edges. Segments are sorted by where they start along the
+    # polygon's longer axis, and each is only tested against the ones that
+    # start within its own extent there, which for a strip keeps the pairs
+    # to O(n) instead of every pair. Returns a boolean array of the tabs that
+    # cross another tab or the polygon. Touching at a shared end doesn't count.
+    ntabs = len(tabs)
+    pt1 = outline[:-1]
+    pt2 = outline[1:]
+    segs = np.vstack((np.column_stack((outline, np.roll(outline, -1, axis=0))),\
+        np.column_stack((pt1, tabs[:,0:2])), tabs, np.column_stack((tabs[:,2:4], pt2))))
+    owner = np.concatenate((np.full(len(outline), -1), np.tile(np.arange(ntabs), 3)))
+    axis = 1 if np.ptp(outline[:,1]) > np.ptp(outline[:,0]) else 0
+    lo = np.minimum(segs[:,axis], segs[:,axis+2])
+    hi = np.maximum(segs[:,axis], segs[:,axis+2])
+    olo = np.minimum(segs[:,1-axis], segs[:,3-axis])
+    ohi = np.maximum(segs[:,1-axis], segs[:,3-axis])
+    eps = 1e-9*max(1.0, float(np.abs(segs).max()))
+    order = np.argsort(lo, kind='stable')
+    # Pairs of each segment with the ones after it in order that start
+    # before it ends
+    pos = np.arange(len(segs))
+    counts = np.searchsorted(lo[order], hi[order] + eps, side='right') - pos - 1
+    i = np.repeat(order, counts)
+    j = order[np.repeat(pos + 1 - np.cumsum(counts) + counts, counts) + np.arange(int(counts.sum()))]
+    keep = (owner[i] != owner[j]) & (ohi[i] >= olo[j] - eps) & (ohi[j] >= olo[i] - eps)
+    i = i[keep]
+    j = j[keep]
+    cross = segmentsCross(segs[i], segs[j], eps)
+    collide = np.zeros(ntabs, dtype=bool)
+    for hit in (owner[i][cross], owner[j][cross]):
+        collide[hit[hit >= 0]] = True
+    return collide
+
+def shrinkCollidingTabs(outline, tabs, counters=None):
+    # Shrinks the tabs that collide (see tabCollisions) toward the middle of
+    # their edges, halving their height and pulling their sides in from the
+    # corners, a few times over if need be. The other tabs are left alone.
+    # Nothing is checked when tabsApart rules collisions out, as it does for
+    # the strips the extruder makes.
+    if tabsApart(outline, tabs):
+        return tabs
+    mid = 0.5*(outline[:-1] + outline[1:])
+    shrunk = np.zeros(len(tabs), dtype=bool)
+    for _ in range(8):
+        collide = tabCollisions(outline, tabs)
+        if not collide.any():
+            break
+        shrunk |= collide
+        tabs[collide,0:2] = mid[collide] + 0.5*(tabs[collide,0:2] - mid[collide])
+        tabs[collide,2:4] = mid[collide] + 0.5*(tabs[collide,2:4] - mid[collide])
+    addCount(counters, 'tab collisions', int(np.count_nonzero(shrunk)))
+    return tabs
+
+def modelOutline(outline, tabs):
+    # The outline of a tabbed strip: the tab points of each edge between its
+    # corners
+    model = np.empty((1+3*len(tabs), 2))
+    model[0] = outline[0]
+    model[1::3] = tabs[:,0:2]
+    model[2::3] = tabs[:,2:4]
+    model[3::3] = outline[1:]
+    return model
+
+def makeModel(outline, tabht, taba, counters=None):
+    # The outline of a tabbed strip: each edge but the closing one gets a tab
+    return modelOutline(outline, shrinkCollidingTabs(outline, makeTabs(outline, tabht, taba, False, counters), counters))
+
+def stripOutline(ypos, width):
+    # The corners of a strip, down the left edge (x=0) through the node
+    # positions ypos and back up the right edge
+    ypos = np.asarray(ypos, dtype=float)
+    left = np.column_stack((np.zeros(len(ypos)), ypos))
+    right = np.column_stack((np.full(len(ypos), float(width)), ypos[::-1]))
+    return np.vstack((left, right))
+
+def splitStrips(seglengths, room, splitmode):
+    # Splits the edges of a closed subpath into strips for the fewest and
+    # balanced split modes. A strip is filled with edges up to room. An edge
+    # too long for any strip is cut where a strip runs out, anywhere along
+    # it (a cut isn't a fold, so it gets no score line); the others are kept
+    # whole. The strips may start at any node: the one giving the fewest
+    # strips is used, the first when there's a tie. Starting at a cut never
+    # saves a strip: if the strips can all end on cuts, they can also be
+    # slid round until one of them ends on a node. In balanced mode the
+    # longest strip is then made as short as it can be without adding a strip.
+    # Returns the edge the first strip starts with and, for each strip, the
+    # node positions down its left edge and whether each node between its
+    # ends is a fold
+    if room <= 0.0:
+        raise ValueError("The tab height must be less than the maximum length of extrusion")
+    seglengths = np.asarray(seglengths, dtype=float)
+    nnodes = len(seglengths)
+    total = float(seglengths.sum())
+    eps = 1e-9*max(1.0, total)
+    # Node positions along the edges gone round twice, so that a strip can
+    # run past the first node, and whether the edge from each node may be cut
+    ends = np.concatenate(([0.0], np.cumsum(np.concatenate((seglengths, seglengths)))))
+    cuttable = np.concatenate((seglengths, seglengths, [0.0])) > room
+    def step(pos, length):
+        # Where strips starting at the positions pos end: as far on as length
+        # reaches if that is in an edge that may be cut, else at the last node
+        reach = pos + length
+        node = np.searchsorted(ends, reach + eps, side='right') - 1
+        return np.where(cuttable[node] & (reach > ends[node] + eps), reach, ends[node])
+    def count(firsts, length, most):
+        # The number of strips from each of the starting positions firsts, or
+        # most+1 where that would take more than most
+        pos = np.asarray(firsts, dtype=float)
+        stop = pos + total - eps
+        nstrips = np.zeros(len(pos), dtype=int)
+        for _ in range(most):
+            going = pos < stop
+            if not going.any():
+                break
+            nstrips += going
+            pos = np.where(going, step(pos, length), pos)
+        nstrips[pos < stop] = most + 1
+        return nstrips
+    def cuts(first, length):
+        bounds = [float(ends[first])]
+        while bounds[-1] < ends[first] + total - eps:
+            bounds.append(float(step(np.array([bounds[-1]]), length)[0]))
+        bounds[-1] = float(ends[first]) + total
+        return bounds
+    # The fewest strips from node 0 bound the search from the other nodes
+    most = len(cuts(0, room)) - 1
+    nstrips = count(ends[:nnodes], room, most)
+    first = int(np.argmin(nstrips))
+    bounds = cuts(first, room)
+    if (splitmode == 'balanced') and (len(bounds) > 2):
+        # Binary search for the shortest longest strip. The strips can't be
+        # shorter than the longest edge that isn't cut
+        short = max([float(seglengths[~cuttable[:nnodes]].max(initial=0.0)), total/(len(bounds)-1)])
+        long = float(max(b - a for a, b in zip(bounds, bounds[1:])))
+        for _ in range(50):
+            mid = 0.5*(short + long)
+            if count(ends[first:first+1], mid, len(bounds)-1)[0] <= len(bounds) - 1:
+                long = mid
+            else:
+                short = mid
+        bounds = cuts(first, long)
+    ystrips = []
+    for a, b in zip(bounds, bounds[1:]):
+        inside = ends[(ends > a + eps) & (ends < b - eps)]
+        ypos = [0.0] + (inside - a).tolist() + [b - a]
+        ystrips.append((ypos, np.ones(len(inside), dtype=bool)))
+    return first, ystrips
+
+def layoutStrips(points, extrude, maxstrip, tab_height, dashlength, native=False, splitmode='greedy'):
+    # Lays the edges of a closed polygon (its corners, with the first repeated
+    # at the end) end to end down the left edge of a strip. In greedy mode a
+    # new strip starts when the next edge (plus a tab) would take it to
+    # maxstrip. The fewest and balanced modes use splitStrips. Score lines go
+    # across the strip at every fold between edges.
+    # Returns a list of (node positions, score lines) for the strips and the
+    # edge the first strip starts with
+    points = np.asarray(points, dtype=float)
+    seglengths = np.sqrt(np.diff(points[:,0])**2 + np.diff(points[:,1])**2).tolist()
+    start = 0
+    if splitmode == 'greedy':
+        ystrips = []
+        ypos = [0.0]
+        for seglength in seglengths:
+            if ypos[-1] + seglength + tab_height >= maxstrip:
+                # have to cut it at last segment
+                ystrips.append((ypos, None))
+                ypos = [0.0]
+            ypos.append(ypos[-1] + seglength)
+        ystrips.append((ypos, None))
+    else:
+        start, ystrips = splitStrips(seglengths, maxstrip - tab_height, splitmode)
+    strips = []
+    for ypos, folds in ystrips:
+        ylines = ypos[1:-1] if folds is None else np.asarray(ypos[1:-1])[folds]
+        scores = [scoreSegments(0.0, y, extrude, y, dashlength, native) for y in ylines]
+        strips.append((np.asarray(ypos, dtype=float), np.vstack([np.empty((0,4))] + scores)))
+    return strips, start
+
+def flattenCubics(ctrl, tolerance):
+    # Lines that stay within tolerance of cubic Beziers, given as an (n,4,2)
+    # array of their control points. For each cubic, Wang's formula gives the
+    # fewest equal steps in t that keep every line within tolerance, and the
+    # cubics are all evaluated at once.
+    # Returns the end points of the lines, all the cubics' in a row (the start
+    # of each cubic is left out), and the number of lines for each cubic
+    ctrl = np.asarray(ctrl, dtype=float).reshape(-1, 4, 2)
+    # Wang's formula for a cubic: n = sqrt(3/4 * M / tolerance), where M is
+    # the largest second difference of the control points
+    second = np.maximum(np.hypot(*(ctrl[:,0] - 2*ctrl[:,1] + ctrl[:,2]).T),\
+        np.hypot(*(ctrl[:,1] - 2*ctrl[:,2] + ctrl[:,3]).T))
+    nsteps = np.maximum(1, np.ceil(np.sqrt(0.75*second/tolerance))).astype(int)
+    ends = np.cumsum(nsteps)
+    # t = 1/n, 2/n ... 1 along every cubic
+    which = np.repeat(np.arange(len(ctrl)), nsteps)
+    t = (np.arange(ends[-1]) - np.repeat(ends - nsteps, nsteps) + 1) / np.repeat(nsteps, nsteps)
+    mt = 1.0 - t
+    cp = ctrl[which]
+    points = (mt**3)[:,None]*cp[:,0] + (3*mt*mt*t)[:,None]*cp[:,1] +\
+        (3*mt*t*t)[:,None]*cp[:,2] + (t**3)[:,None]*cp[:,3]
+    return points, nsteps
+
+def simplifyRing(points, tolerance, counters=None):
+    # Douglas-Peucker simplification of a closed polygon (its corners, without
+    # the first repeated): drops the corners that are within tolerance of the
+    # line between the corners kept on either side. A tolerance of zero drops
+    # just the collinear corners. The ring is split at the first corner and
+    # the corner farthest from it, both of which are kept, so it starts where
+    # it did. Returns the corners kept, or None when fewer than three would be
+    points = np.asarray(points, dtype=float)
+    nnodes = len(points)
+    addCount(counters, 'nodes before simplification', nnodes)
+    if nnodes < 4:
+        return None
+    ring = np.vstack((points, points[:1]))
+    extent = float(np.ptp(points, axis=0).max())
+    tolerance = max(tolerance, 1e-9*extent) # so that collinear means collinear to rounding
+    keep = np.zeros(nnodes+1, dtype=bool)
+    far = int(np.argmax(np.hypot(*(points - points[0]).T)))
+    keep[[0, far, nnodes]] = True
+    stack = [(0, far), (far, nnodes)]
+    while len(stack) > 0:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        chord = ring[last] - ring[first]
+        rel = ring[first+1:last] - ring[first]
+        length = math.hypot(*chord)
+        if length > 0.0:
+            dist = np.abs(chord[0]*rel[:,1] - chord[1]*rel[:,0])/length
+        else:
+            dist = np.hypot(*rel.T)
+        worst = int(np.argmax(dist))
+        if dist[worst] > tolerance:
+            mid = first + 1 + worst
+            keep[mid] = True
+            stack.extend([(first, mid), (mid, last)])
+    kept = points[keep[:-1]]
+    if len(kept) < 3:
+        return None
+    addCount(counters, 'nodes removed', nnodes - len(kept))
+    return kept
+
+def extrudeRing(points, extrude=1.0, maxstrip=11.5, tabheight=0.4, tabangle=45.0, dashlength=0.1,\
+        native=False, splitmode='greedy', counters=None):
+    # The extrusion of one closed polygon, given by its corners (the first may
+    # be repeated at the end or not), as the extruder works it out for a path
+    # with the same settings. Returns the edge the first strip starts with
+    # and, for each strip, a dict of arrays:
+    #   outline      the corners of the strip (the wrapper)
+    #   scores       the score lines across it
+    #   tabs         the two tab points of each edge of the outline but the last
+    #   model        the outline of the tabbed strip
+    #   modelscores  the score lines of the tabbed strip (across it and along
+    #                the edges the tabs fold on)
+    # Raises ValueError for fewer than 3 distinct corners, which enclose nothing
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if len(np.unique(points, axis=0)) < 3:
+        raise ValueError("A closed path needs at least 3 distinct points to be extruded")
+    if (points[0] != points[-1]).any():
+        points = np.vstack((points, points[:1]))
+    ystrips, start = layoutStrips(points, extrude, maxstrip, tabheight, dashlength, native, splitmode)
+    strips = []
+    for ypos, scores in ystrips:
+        outline = stripOutline(ypos, extrude)
+        tabs = shrinkCollidingTabs(outline, makeTabs(outline, tabheight, tabangle, False, counters), counters)
+        strips.append({'outline': outline, 'scores': scores, 'tabs': tabs, 'model': modelOutline(outline, tabs),\
+            'modelscores': np.vstack((scores, edgeScores(outline, dashlength, native)))})
+    addCount(counters, 'strips', len(strips))
+    return start, strips
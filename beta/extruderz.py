@@ -25,51 +25,162 @@ for covering the tabbed strips.
 """
 
 import inkex
+import argparse
+import collections
+import hashlib
+import itertools
 import math
-import copy
+import json
+import os
+import sys
+import time
+import numpy as np
+import extrudergeom
 
 from inkex import PathElement, Style, TextElement
-from inkex.paths import Path, Move, Line, ZoneClose
+from inkex.paths import Path, Move, Line, Curve, Quadratic, ZoneClose
 from inkex.elements._groups import Group, Layer
+from lxml import etree
+from extrudergeom import pnPolygon, pnPoints
+
+# Attributes on the generated elements: the id of the path they came from, the
+# fingerprint of that path and its settings, the box of a piece and the number
+# of a sheet outline
+SOURCE_ATTR = 'data-extruderz-source'
+FINGERPRINT_ATTR = 'data-extruderz-fingerprint'
+BOX_ATTR = 'data-extruderz-box'
+SHEET_ATTR = 'data-extruderz-sheet'
 
 class pathStruct(object):
     def __init__(self):
         self.id="path0000"
-        self.path=Path()
+        self._path=Path()
+        self._polygon=None
         self.enclosed=False
+        self.parent=None # smallest subpath enclosing this one
+        self.depth=0 # nesting depth (odd depths are cutouts)
         self.style = None
     def __str__(self):
         return self.path
+    @property
+    def path(self):
+        return self._path
+    @path.setter
+    def path(self, path):
+        self._path = path
+        self._polygon = None
+    @property
+    def polygon(self):
+        # The pnPolygon for this path, built on first use. Assigning a new path
+        # or appending commands to it rebuilds it; any other in-place edit of
+        # the path needs a call to invalidate()
+        if (self._polygon is None) or (self._polygon.count != len(self._path)):
+            self._polygon = pnPolygon.fromPath(self._path)
+        return self._polygon
+    def invalidate(self):
+        self._polygon = None
     
-class pnPoint(object):
-   # This class came from https://github.com/JoJocoder/PNPOLY
-    def __init__(self,p):
-        self.p=p
-    def __str__(self):
-        return self.p
-    def InPolygon(self,polygon,BoundCheck=False):
-        inside=False
-        if BoundCheck:
-            minX=polygon[0][0]
-            maxX=polygon[0][0]
-            minY=polygon[0][1]
-            maxY=polygon[0][1]
-            for p in polygon:
-                minX=min(p[0],minX)
-                maxX=max(p[0],maxX)
-                minY=min(p[1],minY)
-                maxY=max(p[1],maxY)
-            if self.p[0]<minX or self.p[0]>maxX or self.p[1]<minY or self.p[1]>maxY:
-                return False
-        j=len(polygon)-1
-        for i in range(len(polygon)):
-            if ((polygon[i][1]>self.p[1])!=(polygon[j][1]>self.p[1]) and (self.p[0]<(polygon[j][0]-polygon[i][0])*(self.p[1]-polygon[i][1])/( polygon[j][1] - polygon[i][1] ) + polygon[i][0])):
-                    inside =not inside
-            j=i
-        return inside
+class stripStruct(object):
+    # One strip of an extrusion, kept as coordinates until it is output: the
+    # positions of its nodes down the left edge (x=0), its width and the score
+    # lines across it as [x1,y1,x2,y2] rows
+    def __init__(self, id, ypos, width, scores):
+        self.id=id
+        self.ypos=np.asarray(ypos,dtype=float)
+        self.width=width
+        self.scores=scores
+    def outline(self):
+        # The corners of the strip, down the left edge and back up the right
+        return extrudergeom.stripOutline(self.ypos,self.width)
+
+class effectProfile(object):
+    # Wall time spent in each phase of effect plus counters of the work done,
+    # for --profile. Time is charged to the current phase until switch() moves
+    # on to another one.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.phases = {}
+        self.counters = {}
+        self.phase = None
+        self.mark = time.perf_counter()
+    def switch(self, phase):
+        # Starts charging time to phase and returns the phase that was current
+        now = time.perf_counter()
+        if self.phase != None:
+            self.phases[self.phase] = self.phases.get(self.phase, 0.0) + now - self.mark
+        self.mark = now
+        last = self.phase
+        self.phase = phase
+        return last
+    def count(self, counter, n=1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+    def merge(self, counters):
+        # Adds in the counters of a profile taken elsewhere (in a worker process)
+        for counter, n in counters.items():
+            self.count(counter, n)
+    def report(self):
+        self.switch(self.phase)
+        return {'phases': self.phases, 'total': sum(self.phases.values()), 'counters': self.counters}
+
+class resultCache(object):
+    # Output kept on disk between runs for --cache, one JSON file per key.
+    # Files are touched when they are read, and evict() removes the least
+    # recently used ones once the cache takes more than maxbytes. Any trouble
+    # with the files just makes for a miss.
+    version = 1 # part of every key, so that a new layout of the output misses
+    def __init__(self, folder, maxbytes):
+        self.folder = folder
+        self.maxbytes = maxbytes
+    def fileName(self, key):
+        return os.path.join(self.folder, key+'.json')
+    def get(self, key):
+        fname = self.fileName(key)
+        try:
+            with open(fname) as fp:
+                records = json.load(fp)
+            os.utime(fname)
+        except (OSError, ValueError):
+            return None
+        return records
+    def put(self, key, records):
+        # Written to a temporary file and renamed, so that another process
+        # never reads half a file
+        fname = self.fileName(key)
+        tmpname = '{0}.{1}.tmp'.format(fname, os.getpid())
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(tmpname, 'w') as fp:
+                json.dump(records, fp, separators=(',',':'))
+            os.replace(tmpname, fname)
+        except OSError:
+            pass
+    def evict(self):
+        files = []
+        try:
+            for entry in os.scandir(self.folder):
+                if entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+        total = sum(size for mtime, size, fname in files)
+        for mtime, size, fname in sorted(files):
+            if total <= self.maxbytes:
+                break
+            try:
+                os.remove(fname)
+            except OSError:
+                pass
+            total -= size
 
 class Extruder(inkex.EffectExtension):
-    
+
+    def __init__(self):
+        super().__init__()
+        self.profile = effectProfile()
+        self.cache = None
+        self.streaming = None
+
     def add_arguments(self, pars):
         pars.add_argument("--usermenu")
         pars.add_argument("--extrude", type=float, default=1.0,\
@@ -88,8 +199,58 @@ class Extruder(inkex.EffectExtension):
             help="What to extrude")
         pars.add_argument("--linesonwrapper", type=inkex.Boolean, dest="linesonwrapper",\
             help="Put dashlines on wrappers")
+        pars.add_argument("--dashmode", default="native", choices=["native", "geometry"],\
+            help="Draw dashlines with stroke-dasharray (native) or as separate dash segments (geometry)")
+        pars.add_argument("--splitmode", default="greedy", choices=["greedy", "fewest", "balanced"],\
+            help="Where to split long extrusions: greedy, the fewest strips or strips of even length")
+        pars.add_argument("--flatness", type=float, default=0.01,\
+            help="Greatest distance between a curve and the lines that replace it, in dimensional units")
+        pars.add_argument("--simplify", type=inkex.Boolean, default=False,\
+            help="Remove nodes that hardly change the shape before extruding")
+        pars.add_argument("--simplifytol", type=float, default=0.0,\
+            help="Greatest distance of a removed node from the simplified outline, in dimensional units (zero for collinear nodes only)")
         pars.add_argument("--unit", default="in",\
             help="Dimensional units")
+        pars.add_argument("--tabsolver", default="analytic", choices=["analytic", "iterative"],\
+            help="How to fit tabs on short edges (iterative is the original stepping search)")
+        pars.add_argument("--profile", default="",\
+            help="Write phase timings and counters as JSON to this file (- for stderr)")
+        pars.add_argument("--workers", type=int, default=1,\
+            help="Number of processes that work out the selected paths in parallel")
+        pars.add_argument("--cache", type=inkex.Boolean, default=False,\
+            help="Keep the generated strips on disk and reuse them for paths that haven't changed")
+        pars.add_argument("--cachedir", default="",\
+            help="Folder for the cache (default ~/.cache/extruderz)")
+        pars.add_argument("--cachesize", type=float, default=50.0,\
+            help="Most megabytes the cache may take")
+        pars.add_argument("--pack", type=inkex.Boolean, default=False,\
+            help="Lay the strips out on sheets instead of at the origin")
+        pars.add_argument("--sheetwidth", type=float, default=0.0,\
+            help="Width of a sheet in dimensional units (zero for the page width)")
+        pars.add_argument("--sheetheight", type=float, default=0.0,\
+            help="Height of a sheet in dimensional units (zero for the page height)")
+        pars.add_argument("--spacing", type=float, default=0.1,\
+            help="Space between strips and around the sheet edges in dimensional units")
+        pars.add_argument("--packrotate", type=inkex.Boolean, default=True,\
+            help="Turn strips a quarter turn where that packs them better")
+        pars.add_argument("--sheets", type=int, default=0,\
+            help="Most sheets to use (zero for as many as needed)")
+        pars.add_argument("--stream", type=inkex.Boolean, default=False,\
+            help="Write the output as the paths are worked out instead of building it all first, for very large command line runs")
+
+    def save_raw(self, ret):
+        self.profile.switch('serialization')
+        if self.streaming == None:
+            super().save_raw(ret)
+        else:
+            self.saveStream()
+        if self.options.profile:
+            report = json.dumps(self.profile.report(), indent=1, sort_keys=True)
+            if self.options.profile == '-':
+                sys.stderr.write(report + '\n')
+            else:
+                with open(self.options.profile, 'w') as fp:
+                    fp.write(report + '\n')
 
     #draw SVG line segment(s) between the given (raw) points
     def drawline(self, dstr, name, parent, sstr=None):
@@ -99,135 +260,53 @@ class Extruder(inkex.EffectExtension):
         else:
             stylestr = sstr
         el = parent.add(PathElement())
-        el.path = dstr
+        if isinstance(dstr, str):
+            el.set('d', dstr) # already path data, so don't parse and reformat it
+        else:
+            el.path = dstr
         el.style = stylestr
         el.label = name
+        if not isinstance(dstr, str):
+            self.profile.count('path commands', len(dstr)) # path data is counted in pathString
+        return el
 
     def add_doc(self, path, apt1, apt2, offset, layer):
         stylestr = "font-size:{0};line-height:1.25;font-family:sans-serif;stroke-width:0.264583".format(offset*2)
-        te = layer.add(TextElement())
-        te.style = stylestr
-        te.label = te.get_id()
-        te.text = "1"
-        te.set('x', apt1.x)
-        te.set('y', apt1.y)
-        te = layer.add(TextElement())
-        te.style = stylestr
-        te.label = te.get_id()
-        te.text = "2"
-        te.set('x', apt2.x)
-        te.set('y', apt2.y)
-        
-    def pathInsidePath(self, path, testpath):
-        enclosed = True
-        for tp in testpath:
-            # If any point in the testpath is outside the path, it's not enclosed
-            if self.insidePath(path, tp) == False:
-                enclosed = False
-                return enclosed # True if testpath is fully enclosed in path
-        return enclosed
+        te1 = layer.add(TextElement())
+        te1.style = stylestr
+        te1.label = te1.get_id()
+        te1.text = "1"
+        te1.set('x', apt1.x)
+        te1.set('y', apt1.y)
+        te2 = layer.add(TextElement())
+        te2.style = stylestr
+        te2.label = te2.get_id()
+        te2.text = "2"
+        te2.set('x', apt2.x)
+        te2.set('y', apt2.y)
+        return te1, te2
         
     def insidePath(self, path, p):
-        point = pnPoint((p.x, p.y))
-        pverts = []
-        for pnum in path:
-            if pnum.letter == 'Z':
-                pverts.append((path[0].x, path[0].y))
-            else:
-                pverts.append((pnum.x, pnum.y))
-        isInside = point.InPolygon(pverts, True)
+        # path is a pathStruct (or Path)
+        self.profile.count('insidePath calls')
+        point = pnPoints((p.x, p.y))
+        isInside = bool(point.InPolygon(self.pathPolygon(path), True)[0])
         return isInside # True if point p is inside path
 
-    def makescore(self, pt1, pt2, dashlength):
-        # Draws a dashed line of dashlength between two points
-        # Dash = dashlength space followed by dashlength mark
-        # if dashlength is zero, we want a solid line
-        # Returns dashed line as a Path object
-        apt1 = Line(0.0,0.0)
-        apt2 = Line(0.0,0.0)
-        ddash = Path()
-        if math.isclose(dashlength, 0.0):
-            #inkex.utils.debug("Draw solid dashline")
-            ddash.extend([Move(pt1.x,pt1.y)])
-            ddash.extend([Line(pt2.x,pt2.y)])
-        else:
-            if math.isclose(pt1.y, pt2.y):
-                #inkex.utils.debug("Draw horizontal dashline")
-                if pt1.x < pt2.x:
-                    xcushion = pt2.x - dashlength
-                    xpt = pt1.x
-                    ypt = pt1.y
-                else:
-                    xcushion = pt1.x - dashlength
-                    xpt = pt2.x
-                    ypt = pt2.y
-                done = False
-                while not(done):
-                    if (xpt + dashlength*2) <= xcushion:
-                        xpt = xpt + dashlength
-                        ddash.extend([Move(xpt,ypt)])
-                        xpt = xpt + dashlength
-                        ddash.extend([Line(xpt,ypt)])
-                    else:
-                        done = True
-            elif math.isclose(pt1.x, pt2.x):
-                #inkex.utils.debug("Draw vertical dashline")
-                if pt1.y < pt2.y:
-                    ycushion = pt2.y - dashlength
-                    xpt = pt1.x
-                    ypt = pt1.y
-                else:
-                    ycushion = pt1.y - dashlength
-                    xpt = pt2.x
-                    ypt = pt2.y
-                done = False
-                while not(done):
-                    if(ypt + dashlength*2) <= ycushion:
-                        ypt = ypt + dashlength         
-                        ddash.extend([Move(xpt,ypt)])
-                        ypt = ypt + dashlength
-                        ddash.extend([Line(xpt,ypt)])
-                    else:
-                        done = True
-            else:
-                #inkex.utils.debug("Draw sloping dashline")
-                if pt1.y > pt2.y:
-                    apt1 = Line(pt1.x,pt1.y)
-                    #apt1.x = pt1.x
-                    #apt1.y = pt1.y
-                    apt2 = Line(pt2.x,pt2.y)
-                    #apt2.x = pt2.x
-                    #apt2.y = pt2.y
-                else:
-                    apt1 = Line(pt2.x,pt2.y)
-                    #apt1.x = pt2.x
-                    #apt1.y = pt2.y
-                    apt2 = Line(pt1.x,pt1.y)
-                    #apt2.x = pt1.x
-                    #apt2.y = pt1.y
-                m = (apt1.y-apt2.y)/(apt1.x-apt2.x)
-                theta = math.atan(m)
-                msign = (m>0) - (m<0)
-                ycushion = apt2.y + dashlength*math.sin(theta)
-                xcushion = apt2.x + msign*dashlength*math.cos(theta)
-                xpt = apt1.x
-                ypt = apt1.y
-                done = False
-                while not(done):
-                    nypt = ypt - dashlength*2*math.sin(theta)
-                    nxpt = xpt - msign*dashlength*2*math.cos(theta)
-                    if (nypt >= ycushion) and (((m<0) and (nxpt <= xcushion)) or ((m>0) and (nxpt >= xcushion))):
-                        # move to end of space / beginning of mark
-                        xpt = xpt - msign*dashlength*math.cos(theta)
-                        ypt = ypt - msign*dashlength*math.sin(theta)
-                        ddash.extend([Move(xpt,ypt)])
-                        # draw the mark
-                        xpt = xpt - msign*dashlength*math.cos(theta)
-                        ypt = ypt - msign*dashlength*math.sin(theta)
-                        ddash.extend([Line(xpt,ypt)])
-                    else:
-                        done = True
-        return ddash
+    def nestPaths(self, npaths):
+        # Sets the parent, depth and enclosed flag of each subpath of a path
+        # from their containment tree (see extrudergeom.nestPolygons)
+        parents, depths = extrudergeom.nestPolygons([npath.polygon for npath in npaths], self.profile.counters)
+        for npath, parent, depth in zip(npaths, parents, depths):
+            npath.parent = None if parent is None else npaths[parent]
+            npath.depth = depth
+            npath.enclosed = (depth % 2 == 1)
+
+    def pathPolygon(self, path):
+        # Use the cached polygon of a pathStruct; build one for a bare Path
+        if isinstance(path, pathStruct):
+            return path.polygon
+        return pnPolygon.fromPath(path)
 
     def detectIntersect(self, x1, y1, x2, y2, x3, y3, x4, y4):
         td = (x1-x2)*(y3-y4)-(y1-y2)*(x3-x4)
@@ -256,97 +335,65 @@ class Extruder(inkex.EffectExtension):
             #tpt2.y = thetal2[1].y
         return tpt1,tpt2
 
+    def tabOrientation(self, tpath, pt1, pt2, tabht):
+        # Finds the side of the edge pt1-pt2 that the tab belongs on, by probing
+        # with a tiny tab. Returns the rotation (theta) and orient vector for
+        # orientTab
+        theta = 0.0
+        if math.isclose(pt1.x, pt2.x):
+            # It's vertical. Let's try the right side
+            if pt1.y < pt2.y:
+                guess = [1,0,1,0,0,1,0,-1]
+                other = [-1,0,-1,0,0,1,0,-1]
+            else: # pt2.y < pt1.y
+                guess = [1,0,1,0,0,-1,0,1]
+                other = [-1,0,-1,0,0,-1,0,1]
+        else:
+            if not math.isclose(pt1.y, pt2.y):
+                # the orientation is neither horizontal nor vertical
+                # Let's get the slope of the line between the points
+                # Because Inkscape's origin is in the upper-left corner,
+                # a positive slope (/) will yield a negative value
+                slope = (pt2.y - pt1.y)/(pt2.x - pt1.x)
+                # Let's get the angle to the horizontal and construct a horizontal tab
+                theta = math.degrees(math.atan(slope))
+            # Let's try the top
+            if pt1.x < pt2.x:
+                guess = [0,1,0,-1,-1,0,-1,0]
+                other = [0,1,0,-1,1,0,1,0]
+            else: # pt2.x < pt1.x
+                guess = [0,-1,0,1,-1,0,-1,0]
+                other = [0,-1,0,1,1,0,1,0]
+        testAngle = 1.0
+        testHt = tabht * 0.001
+        pnpt1,pnpt2 = self.orientTab(pt1,pt2,testHt,testAngle,theta,guess)
+        if ((not tpath.enclosed) and (self.insidePath(tpath, pnpt1) or self.insidePath(tpath, pnpt2))) or \
+           (tpath.enclosed and ((not self.insidePath(tpath, pnpt1)) and (not self.insidePath(tpath, pnpt2)))):
+            return theta, other # Guessed wrong
+        return theta, guess # Guessed right
+
     def makeTab(self, tpath, pt1, pt2, tabht, taba):
         # tpath - the pathstructure containing pt1 and pt2
         # pt1, pt2 - the two points where the tab will be inserted
         # tabht - the height of the tab
         # taba - the angle of the tab sides
         # returns the two tab points (Line objects) in order of closest to pt1
-        tpt1 = Line(0.0,0.0)
-        tpt2 = Line(0.0,0.0)
+        # This is the original tab fitting, used by --tabsolver=iterative: it
+        # steps the tab angle and then the tab height until the tab sides no
+        # longer intersect (extrudergeom.solveTabs works the fit out directly)
+        self.profile.count('makeTab calls')
         currTabHt = tabht
         currTabAngle = taba
-        testAngle = 1.0
-        testHt = currTabHt * 0.001
         adjustTab = 0
         tabDone = False
+        # Let's find out the orientation of the tab
+        theta, orient = self.tabOrientation(tpath, pt1, pt2, tabht)
         while not tabDone:
-            # Let's find out the orientation of the tab
-            if math.isclose(pt1.x, pt2.x):
-                # It's vertical. Let's try the right side
-                if pt1.y < pt2.y:
-                    pnpt1,pnpt2 = self.orientTab(pt1,pt2,testHt,testAngle,0.0,[1,0,1,0,0,1,0,-1])
-                    if ((not tpath.enclosed) and (self.insidePath(tpath.path, pnpt1) or self.insidePath(tpath.path, pnpt2))) or \
-                       (tpath.enclosed and ((not self.insidePath(tpath.path, pnpt1)) and (not self.insidePath(tpath.path, pnpt2)))):
-                        tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,0.0,[-1,0,-1,0,0,1,0,-1]) # Guessed wrong
-                    else:
-                        tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,0.0,[1,0,1,0,0,1,0,-1]) # Guessed right
-                else: # pt2.y < pt1.y
-                    pnpt1,pnpt2 = self.orientTab(pt1,pt2,testHt,testAngle,0.0,[1,0,1,0,0,-1,0,1])
-                    if ((not tpath.enclosed) and (self.insidePath(tpath.path, pnpt1) or self.insidePath(tpath.path, pnpt2))) or \
-                       (tpath.enclosed and ((not self.insidePath(tpath.path, pnpt1)) and (not self.insidePath(tpath.path, pnpt2)))):
-                        tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,0.0,[-1,0,-1,0,0,-1,0,1]) # Guessed wrong
-                    else:
-                        tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,0.0,[1,0,1,0,0,-1,0,1]) # Guessed right
-            elif math.isclose(pt1.y, pt2.y):
-                # It's horizontal. Let's try the top
-                if pt1.x < pt2.x:
-                    pnpt1,pnpt2 = self.orientTab(pt1,pt2,testHt,testAngle,0.0,[0,1,0,-1,-1,0,-1,0])
-                    if ((not tpath.enclosed) and (self.insidePath(tpath.path, pnpt1) or self.insidePath(tpath.path, pnpt2))) or \
-                       (tpath.enclosed and ((not self.insidePath(tpath.path, pnpt1)) and (not self.insidePath(tpath.path, pnpt2)))):
-                        tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,0.0,[0,1,0,-1,1,0,1,0]) # Guessed wrong
-                    else:
-                        tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,0.0,[0,1,0,-1,-1,0,-1,0]) # Guessed right
-                else: # pt2.x < pt1.x
-                    pnpt1,pnpt2 = self.orientTab(pt1,pt2,testHt,testAngle,0.0,[0,-1,0,1,-1,0,-1,0])
-                    if ((not tpath.enclosed) and (self.insidePath(tpath.path, pnpt1) or self.insidePath(tpath.path, pnpt2))) or \
-                       (tpath.enclosed and ((not self.insidePath(tpath.path, pnpt1)) and (not self.insidePath(tpath.path, pnpt2)))):
-                        tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,0.0,[0,-1,0,1,1,0,1,0]) # Guessed wrong
-                    else:
-                        tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,0.0,[0,-1,0,1,-1,0,-1,0]) # Guessed right
-
-            else: # the orientation is neither horizontal nor vertical
-                # Let's get the slope of the line between the points
-                # Because Inkscape's origin is in the upper-left corner,
-                # a positive slope (/) will yield a negative value
-                slope = (pt2.y - pt1.y)/(pt2.x - pt1.x)
-                # Let's get the angle to the horizontal
-                theta = math.degrees(math.atan(slope))
-                # Let's construct a horizontal tab
-                seglength = math.sqrt((pt1.x-pt2.x)**2 +(pt1.y-pt2.y)**2)
-                if slope < 0.0:
-                    if pt1.x < pt2.x:
-                        pnpt1,pnpt2 = self.orientTab(pt1,pt2,testHt,testAngle,theta,[0,1,0,-1,-1,0,-1,0])
-                        if ((not tpath.enclosed) and (self.insidePath(tpath.path, pnpt1) or self.insidePath(tpath.path, pnpt2))) or \
-                           (tpath.enclosed and ((not self.insidePath(tpath.path, pnpt1)) and (not self.insidePath(tpath.path, pnpt2)))):
-                            tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,theta,[0,1,0,-1,1,0,1,0]) # Guessed wrong
-                        else:
-                            tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,theta,[0,1,0,-1,-1,0,-1,0]) # Guessed right
-                    else: # pt1.x > pt2.x
-                        pnpt1,pnpt2 = self.orientTab(pt1,pt2,testHt,testAngle,theta,[0,-1,0,1,-1,0,-1,0])
-                        if ((not tpath.enclosed) and (self.insidePath(tpath.path, pnpt1) or self.insidePath(tpath.path, pnpt2))) or \
-                           (tpath.enclosed and ((not self.insidePath(tpath.path, pnpt1)) and (not self.insidePath(tpath.path, pnpt2)))):
-                            tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,theta,[0,-1,0,1,1,0,1,0]) # Guessed wrong
-                        else:
-                            tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,theta,[0,-1,0,1,-1,0,-1,0]) # Guessed right
-                else: # slope > 0.0
-                    if pt1.x < pt2.x:
-                        pnpt1,pnpt2 = self.orientTab(pt1,pt2,testHt,testAngle,theta,[0,1,0,-1,-1,0,-1,0])
-                        if ((not tpath.enclosed) and (self.insidePath(tpath.path, pnpt1) or self.insidePath(tpath.path, pnpt2))) or \
-                           (tpath.enclosed and ((not self.insidePath(tpath.path, pnpt1)) and (not self.insidePath(tpath.path, pnpt2)))):
-                            tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,theta,[0,1,0,-1,1,0,1,0]) # Guessed wrong
-                        else:
-                            tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,theta,[0,1,0,-1,-1,0,-1,0]) # Guessed right
-                    else: # pt1.x > pt2.x
-                        pnpt1,pnpt2 = self.orientTab(pt1,pt2,testHt,testAngle,theta,[0,-1,0,+1,-1,0,-1,0])
-                        if ((not tpath.enclosed) and (self.insidePath(tpath.path, pnpt1) or self.insidePath(tpath.path, pnpt2))) or \
-                           (tpath.enclosed and ((not self.insidePath(tpath.path, pnpt1)) and (not self.insidePath(tpath.path, pnpt2)))):
-                            tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,theta,[0,-1,0,1,1,0,1,0]) # Guessed wrong
-                        else:
-                            tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,theta,[0,-1,0,1,-1,0,-1,0]) # Guessed right
+            tpt1,tpt2 = self.orientTab(pt1,pt2,currTabHt,currTabAngle,theta,orient)
             # Check to see if any tabs intersect each other
             if self.detectIntersect(pt1.x, pt1.y, tpt1.x, tpt1.y, pt2.x, pt2.y, tpt2.x, tpt2.y):
                 # Found an intersection.
+                self.profile.count('makeTab retries')
                 if adjustTab == 0:
                     # Try increasing the tab angle in one-degree increments
                     currTabAngle = currTabAngle + 1.0
@@ -367,207 +414,726 @@ class Extruder(inkex.EffectExtension):
             
         return tpt1,tpt2
 
+    def pathString(self, segments=None, polygon=None):
+        # Writes path data straight from coordinate arrays: a Move and a Line
+        # for each [x1,y1,x2,y2] row of segments, then the points of polygon
+        # as a closed path. The commands for all the points go into one format
+        # string that is filled in a single pass, with numbers formatted as
+        # inkex does.
+        # The commands are counted here, from the arrays, for the profile
+        num = Line.number_template
+        template = []
+        coords = []
+        if (segments is not None) and (len(segments) > 0):
+            template.append(" ".join(["M {0} {0} L {0} {0}".format(num)]*len(segments)))
+            coords.append(segments.ravel())
+            self.profile.count('path commands', 2*len(segments))
+        if (polygon is not None) and (len(polygon) > 0):
+            template.append("M {0} {0}".format(num) + " L {0} {0}".format(num)*(len(polygon)-1) + " Z")
+            coords.append(polygon.ravel())
+            self.profile.count('path commands', len(polygon) + 1)
+        if len(coords) == 0:
+            return ""
+        return " ".join(template).format(*np.concatenate(coords).tolist())
+
+    def layoutStrips(self, opath, extrude, maxstrip, tab_height, dashlength, native=False, splitmode='greedy'):
+        # Lays the edges of a subpath end to end down the left edge of a strip
+        # (see extrudergeom.layoutStrips)
+        # Returns a list of stripStructs and the edge the first strip starts with
+        poly = opath.polygon
+        try:
+            ystrips, start = extrudergeom.layoutStrips(np.column_stack((poly.x, poly.y)), extrude, maxstrip,\
+                tab_height, dashlength, native, splitmode)
+        except ValueError as err:
+            raise inkex.AbortExtension(str(err))
+        return [stripStruct(opath.id+"x", ypos, extrude, scores) for ypos, scores in ystrips], start
+
+    def makeTabs(self, outline, tabht, taba, enclosed=False):
+        # Tabs for every edge of a polygon but the closing one, all at once.
+        # outline is an (n,2) array of the polygon's corners.
+        # Returns an (n-1,4) array of the two tab points of each edge
+        if self.options.tabsolver == 'iterative':
+            # one edge at a time, as makeTab always did
+            tpath = pathStruct()
+            tpath.enclosed = enclosed
+            pts = outline.tolist()
+            tpath.path = Path([Move(*pts[0])] + [Line(x,y) for x,y in pts[1:]] + [ZoneClose()])
+            tabs = []
+            for ptn in range(len(pts)-1):
+                tpt1, tpt2 = self.makeTab(tpath, tpath.path[ptn], tpath.path[ptn+1], tabht, taba)
+                tabs.append((tpt1.x, tpt1.y, tpt2.x, tpt2.y))
+            return np.array(tabs).reshape(-1,4)
+        return extrudergeom.makeTabs(outline, tabht, taba, enclosed, self.profile.counters)
+
+    def makeModel(self, outline, tabht, taba):
+        # The outline of a tabbed strip: each edge but the closing one gets a tab.
+        # Tabs that collide are shrunk (see extrudergeom.shrinkCollidingTabs)
+        tabs = extrudergeom.shrinkCollidingTabs(outline, self.makeTabs(outline, tabht, taba), self.profile.counters)
+        return extrudergeom.modelOutline(outline, tabs)
+
+    def selectedPaths(self, geom, previous):
+        # Yields the selected paths one at a time as (element, fingerprint, path,
+        # style). The path has absolute coordinates with the element's transform
+        # and those of the groups it is in applied, and the style has its stroke
+        # width scaled to match.
+        # The element itself is left alone, so nothing is copied here. A path
+        # whose outputs from an earlier run (in previous, see previousOutputs)
+        # have the same fingerprint is skipped without any work on it.
+        for elem in self.svg.selection.filter(PathElement):
+            transform = self.composedTransform(elem)
+            fingerprint = self.fingerprint(elem, geom, transform)
+            old = previous.get(elem.get_id(), [])
+            if (len(old) > 0) and all(oelem.get(FINGERPRINT_ATTR) == fingerprint for oelem in old):
+                self.profile.count('unchanged elements')
+                continue
+            self.profile.switch('transform application')
+            sstr = elem.attrib.get('style')
+            path = elem.path.to_absolute()
+            if not transform == inkex.Transform():
+                path = self.transformPath(path, transform)
+                if sstr != None:
+                    sstr = self.scaleStroke(sstr, extrudergeom.transformScale(transform.matrix))
+            yield elem, fingerprint, path, sstr
+
+    def composedTransform(self, elem):
+        # The transform of an element and of all the groups it is in. The
+        # attributes are read as they are, because elem.transform would
+        # rewrite them in inkex's own form
+        transform = inkex.Transform()
+        node = elem
+        while node is not None:
+            if 'transform' in node.attrib:
+                transform = inkex.Transform(node.attrib['transform']) @ transform
+            node = node.getparent()
+        return transform
+
+    def transformPath(self, path, transform):
+        # An absolute path with an affine transform applied to it. The points
+        # of all its commands go through the transform in one pass and the
+        # commands are rebuilt around them. H and V become lines, and the
+        # shorthand curves and arcs become the curves they stand for, since
+        # they don't keep their meaning under every transform.
+        letters = []
+        args = []
+        for seg in path.to_non_shorthand().proxy_iterator():
+            if seg.letter == 'A':
+                for curve in seg.to_curves():
+                    letters.append('C')
+                    args.extend(curve.args)
+            else:
+                letters.append(seg.letter)
+                args.extend(seg.args)
+        points = extrudergeom.transformPoints(args, transform.matrix).ravel().tolist()
+        commands = {'M': Move, 'L': Line, 'C': Curve, 'Q': Quadratic, 'Z': ZoneClose}
+        sizes = {'M': 2, 'L': 2, 'C': 6, 'Q': 4, 'Z': 0}
+        tpath = Path()
+        pos = 0
+        for letter in letters:
+            tpath.append(commands[letter](*points[pos:pos+sizes[letter]]))
+            pos += sizes[letter]
+        return tpath
+
+    def scaleStroke(self, sstr, escale):
+        # A style string with its stroke width multiplied by escale, as the
+        # stroke is scaled along with the path by the transform applied to it
+        tokens = sstr.split(';')
+        for stoken in range(len(tokens)):
+            name, sep, value = tokens[stoken].partition(':')
+            if name.strip() == 'stroke-width':
+                number = value.strip().rstrip('abcdefghijklmnopqrstuvwxyz')
+                unit = value.strip()[len(number):]
+                try:
+                    tokens[stoken] = name + sep + str(float(number)*escale) + unit
+                except ValueError:
+                    pass # a percentage or something else that can't be scaled
+        return ";".join(tokens)
+
+    def fingerprint(self, elem, geom, transform):
+        # A hash of everything the outputs of a selected path depend on.
+        # transform is the element's composed transform, so that moving a
+        # group the path is in counts as a change too.
+        data = json.dumps([resultCache.version, elem.get_id(), elem.attrib.get('d'), transform.matrix,\
+            elem.attrib.get('style'), geom, self.options.tabsolver], sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+    def previousOutputs(self):
+        # The outputs of earlier runs in the document, as lists of elements by
+        # the id of the path they came from
+        previous = {}
+        for oelem in self.svg.xpath('//*[@{0}]'.format(SOURCE_ATTR)):
+            previous.setdefault(oelem.get(SOURCE_ATTR), []).append(oelem)
+        return previous
+
+    def replaceOutputs(self, old, new, doc_layer):
+        # Puts the new outputs of a path where its old outputs are, the node
+        # numbers with the old node numbers and the rest with the rest, and
+        # removes the old ones
+        for indoc in (False, True):
+            anchors = [oelem for oelem in old if (oelem.getparent() is doc_layer) == indoc]
+            if len(anchors) > 0:
+                for nelem in new:
+                    if (nelem.getparent() is doc_layer) == indoc:
+                        anchors[0].addprevious(nelem)
+        for oelem in old:
+            oelem.delete()
+
+    def flattenPath(self, path, tolerance):
+        # Replaces the curves (C, S, Q, T and A) in an absolute path with lines
+        # that stay within tolerance of them. Each curve is made into cubic
+        # Beziers, which extrudergeom.flattenCubics flattens all at once.
+        # Other commands are kept as they are.
+        if all(seg.letter in 'MLHVZ' for seg in path):
+            return path
+        if tolerance <= 0.0:
+            raise inkex.AbortExtension("The curve tolerance must be more than zero")
+        layout = [] # the commands, with the number of a cubic where its lines go
+        cubics = []
+        for seg in path.proxy_iterator():
+            if seg.letter in 'CSQTA':
+                start = seg.previous_end_point
+                for curve in seg.to_curves():
+                    cubics.append([start.x, start.y] + list(curve.args))
+                    layout.append(len(cubics)-1)
+                    start = inkex.Vector2d(*curve.args[4:6])
+            else:
+                layout.append(seg.command)
+        ctrl = np.array(cubics).reshape(-1, 4, 2)
+        points, nsteps = extrudergeom.flattenCubics(ctrl, tolerance)
+        ends = np.cumsum(nsteps)
+        points = points.tolist()
+        self.profile.count('curves flattened', len(ctrl))
+        self.profile.count('curve lines', int(ends[-1]))
+        flat = Path()
+        for item in layout:
+            if isinstance(item, int):
+                flat.extend([Line(x, y) for x, y in points[ends[item]-nsteps[item]:ends[item]]])
+            else:
+                flat.append(item)
+        return flat
+
+    def simplifyPath(self, npath, tolerance):
+        # Douglas-Peucker simplification of a closed subpath (see
+        # extrudergeom.simplifyRing). It is left alone when fewer than three
+        # nodes would be kept.
+        kept = extrudergeom.simplifyRing(np.column_stack((npath.polygon.x, npath.polygon.y))[:-1], tolerance,\
+            self.profile.counters)
+        if kept is not None:
+            npath.path = Path([Move(*kept[0])] + [Line(*pt) for pt in kept[1:]] + [Line(*kept[0])])
+
+    def elementGeometry(self, eid, path, style, geom):
+        # Works out everything that is drawn for one selected path, without
+        # touching the document, so that it can run in a worker process. path
+        # has absolute coordinates and geom holds the settings from effect (in
+        # user units). Returns the output in drawing order as records:
+        #   ('doc', x1, y1, x2, y2, offset)       node numbers for add_doc
+        #   ('path', dstr, label, style, box)     a path on the layer
+        #   ('group', label, [(dstr, label, style), ...], box)  paths in a group
+        # where box is the bounding box of a piece (see pieceBox)
+        extrude_it = geom['extrudeit']
+        npaths = []
+        output = []
+        self.profile.switch('subpath parsing')
+        last_letter = 'Z'
+        idmod = 0
+        path = self.flattenPath(path, geom['flatness'])
+        for ptoken in path: # For each point in the path
+            if ptoken.letter == 'M': # Starting point
+                # Hold this point in case we receive a Z
+                ptx1 = mx = ptoken.x
+                pty1 = my = ptoken.y
+                '''
+                Assign a structure to the new path. We assume that there is
+                only one path and, therefore, it isn't enclosed by a
+                sub-path. However, we'll suffix the ID, if we find a
+                sub-path.
+                '''
+                npath = pathStruct()
+                npath.enclosed = False
+                npath.id = eid+"-"+str(idmod)
+                npath.style = style
+                idmod += 1
+                npath.path.extend([Move(ptx1,pty1)])
+            elif (ptoken.letter == 'Z') and (last_letter != 'M') and (ptx2 == mx) and (pty2 == my):
+                pass # the last line already closed the subpath, and it has been added
+            else:
+                if last_letter != 'M':
+                    ptx1 = ptx2
+                    pty1 = pty2
+                if ptoken.letter == 'L':
+                    ptx2 = ptoken.x
+                    pty2 = ptoken.y
+                elif ptoken.letter == 'H':
+                    ptx2 = ptoken.x
+                    pty2 = pty1
+                elif ptoken.letter == 'V':
+                    ptx2 = ptx1
+                    pty2 = ptoken.y
+                elif ptoken.letter == 'Z':
+                    ptx2 = mx
+                    pty2 = my
+                else:
+                    raise inkex.AbortExtension("Unrecognized path command {0}".format(ptoken.letter))
+                npath.path.extend([Line(ptx2,pty2)])
+                if ptoken.letter == 'Z' or ((ptx2 == mx) and (pty2 == my)):
+                    npaths.append(npath)
+            last_letter = ptoken.letter
+        if geom['simplify'] != None:
+            self.profile.switch('simplification')
+            for npath in npaths:
+                self.simplifyPath(npath, geom['simplify'])
+        # check for cutouts
+        self.profile.switch('cutout detection')
+        self.profile.count('subpaths', len(npaths))
+        if idmod > 1:
+            self.nestPaths(npaths)
+        for opath in npaths:
+            if (extrude_it == 'both') or (((extrude_it == 'cutouts') and (opath.enclosed)) or ((extrude_it == 'outline') and (not opath.enclosed))):
+                records = None
+                if self.cache != None:
+                    self.profile.switch('result cache')
+                    key = self.cacheKey(opath, geom)
+                    records = self.cache.get(key)
+                    self.profile.count('cache hits' if records != None else 'cache misses')
+                if records == None:
+                    records = self.subpathGeometry(opath, geom)
+                    if self.cache != None:
+                        self.cache.put(key, records)
+                output.extend(records)
+        return output
+
+    def subpathGeometry(self, opath, geom):
+        # The output records (see elementGeometry) for one subpath
+        extrude = geom['extrude']
+        maxstrip = geom['maxstrip']
+        tab_angle = geom['tabangle']
+        tab_height = geom['tabheight']
+        dashlength = geom['dashlength']
+        lines_on_wrapper = geom['linesonwrapper']
+        native_dash = geom['nativedash']
+        split_mode = geom['splitmode']
+        scorestr = geom['scorestr']
+        output = []
+        self.profile.switch('strip layout')
+        # create the extruded path. A single strip might be larger than the paper
+        strips, start = self.layoutStrips(opath, extrude, maxstrip, tab_height, dashlength, native_dash, split_mode)
+        if len(opath.path) > 1:
+            # Let's draw the first two node numbers to show the starting point and direction
+            output.append(('doc', opath.path[start].x, opath.path[start].y, opath.path[start+1].x, opath.path[start+1].y, 0.5*tab_height))
+        self.profile.count('strips', len(strips))
+        self.profile.switch('wrapper output')
+        sstr = opath.style
+        if native_dash:
+            # Dashed score lines take the model's stroke
+            if sstr == None:
+                dashstr = Style({'stroke':'#000000','stroke-width':'0.25'})
+            else:
+                dashstr = Style(sstr)
+            dashstr['fill'] = 'none'
+            dashstr['stroke-dasharray'] = '{0:.8g},{0:.8g}'.format(dashlength)
+            dashstr['stroke-dashoffset'] = '0'
+            linestr = str(dashstr)
+        else:
+            linestr = scorestr
+        # Generate the wrappers from the extruded paths
+        for stripcnt in range(len(strips)):
+            outline = strips[stripcnt].outline()
+            scores = strips[stripcnt].scores
+            if (math.isclose(dashlength, 0.0) or native_dash) and (len(scores) > 0):
+                if lines_on_wrapper:
+                    output.append(('group', 'g'+opath.id+'ws'+str(stripcnt), [
+                        (self.pathString(polygon=outline),'wrapper'+str(stripcnt),sstr), # Output the model
+                        (self.pathString(scores),'score'+str(stripcnt)+'w',linestr)], self.pieceBox(outline))) # Output the scorelines separately
+                else:
+                    output.append(('path', self.pathString(polygon=outline),'wrapper'+str(stripcnt),sstr, self.pieceBox(outline))) # Output the model
+            else:
+                if (len(scores) > 0) and lines_on_wrapper:
+                    output.append(('path', self.pathString(scores,outline),opath.id+'ws'+str(stripcnt),sstr, self.pieceBox(outline)))
+                else:
+                    output.append(('path', self.pathString(polygon=outline),opath.id+'w'+str(stripcnt),sstr, self.pieceBox(outline)))
+        # Generate the tabbed strips from the extruded paths
+        for stripcnt in range(len(strips)):
+            outline = strips[stripcnt].outline()
+            self.profile.switch('tab generation')
+            model = self.makeModel(outline, tab_height, tab_angle)
+            self.profile.switch('score generation')
+            scores = np.vstack((strips[stripcnt].scores, extrudergeom.edgeScores(outline, dashlength, native_dash)))
+            self.profile.switch('model output')
+            if (math.isclose(dashlength, 0.0) or native_dash) and (len(scores) > 0):
+                output.append(('group', 'g'+opath.id+'ms'+str(stripcnt), [
+                    (self.pathString(polygon=model),'model'+str(stripcnt),sstr), # Output the model
+                    (self.pathString(scores),'score'+str(stripcnt)+'m',linestr)], self.pieceBox(model))) # Output the scorelines separately
+            else:
+                if len(scores) > 0:
+                    output.append(('path', self.pathString(scores,model),opath.id+'ms'+str(stripcnt),sstr, self.pieceBox(model)))
+                else:
+                    output.append(('path', self.pathString(polygon=model),opath.id+'m'+str(stripcnt),sstr, self.pieceBox(model)))
+        return output
+
+    def cacheKey(self, opath, geom):
+        # A hash of everything the output of a subpath depends on: its
+        # coordinates, id and style, whether it is a cutout and the settings
+        # (which are in user units, so the unit is covered too)
+        poly = opath.polygon
+        settings = json.dumps([resultCache.version, opath.id, opath.style, bool(opath.enclosed), geom,\
+            self.options.tabsolver], sort_keys=True)
+        digest = hashlib.sha256(settings.encode('utf-8'))
+        digest.update(np.ascontiguousarray(poly.x, dtype=float).tobytes())
+        digest.update(np.ascontiguousarray(poly.y, dtype=float).tobytes())
+        return digest.hexdigest()
+
+    def openCache(self):
+        # The result cache for --cache, or None
+        if not self.options.cache:
+            return None
+        folder = self.options.cachedir
+        if folder == '':
+            folder = os.path.join(os.path.expanduser('~'), '.cache', 'extruderz')
+        return resultCache(folder, int(float(self.options.cachesize)*1024*1024))
+
+    def workerOutputs(self, jobs, geom, njobs):
+        # Runs elementGeometry on each job in a pool of --workers processes and
+        # yields the outputs in job order, so the document comes out the same
+        # as in a sequential run. Jobs go out in small batches, and only two
+        # batches per worker are handed out ahead of the output being used, so
+        # that with --stream the outputs waiting to be written don't pile up.
+        options = argparse.Namespace(tabsolver=self.options.tabsolver, profile=self.options.profile,\
+            cache=self.options.cache, cachedir=self.options.cachedir, cachesize=self.options.cachesize)
+        workers = min(self.options.workers, njobs)
+        self.profile.switch('worker geometry')
+        # imported here, as most runs have no use for it and it is slow to load
+        from concurrent.futures import ProcessPoolExecutor
+        batch = max(1, min(njobs//(4*workers), 8))
+        jobs = iter(jobs)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            running = collections.deque()
+            while True:
+                works = [(job, geom, options) for job in itertools.islice(jobs, batch)]
+                if len(works) > 0:
+                    running.append(pool.submit(elementBatch, works))
+                    if len(running) < 2*workers:
+                        continue
+                elif len(running) == 0:
+                    break
+                for output, counters in running.popleft().result():
+                    self.profile.merge(counters)
+                    yield output
+
+    def addOutputs(self, elem, fingerprint, output, layer, doc_layer, parent=None):
+        # Adds a copy of a selected path and its outputs to the document, tagged
+        # with where they came from. Returns them as placeOutput does. They go
+        # in parent, which is the layer unless given; the copy is placed to be
+        # seen where the path is once parent's contents end up in the layer.
+        self.profile.switch('selection copy')
+        self.profile.count('elements')
+        backend = elem.copy() # Make a copy of it
+        backend.label = elem.get_id()+'-copy'
+        transform = -self.composedTransform(layer) @ self.composedTransform(elem)
+        if not transform == inkex.Transform(elem.attrib.get('transform')):
+            # so that the copy stays where the path is, out of the groups it is in
+            backend.transform = transform
+        if parent is None:
+            parent = layer
+        parent.append(backend)
+        self.profile.switch('output')
+        placed = [(backend, None)] + self.placeOutput(output, parent, doc_layer)
+        for nelem, box in placed:
+            nelem.set(SOURCE_ATTR, elem.get_id())
+            nelem.set(FINGERPRINT_ATTR, fingerprint)
+            if box != None:
+                nelem.set(BOX_ATTR, " ".join("{0:.17g}".format(v) for v in box))
+        return placed
+
+    def saveStream(self):
+        # Streams the document into a temporary file (next to the output file,
+        # when there is one) that takes the output's place only once all of it
+        # is written. A run that aborts part way through then leaves no output,
+        # as without --stream, instead of a short document that looks whole.
+        # imported here, as only --stream runs need them
+        import shutil
+        import tempfile
+        output = self.options.output
+        folder = os.path.dirname(os.path.abspath(output)) if isinstance(output, str) else None
+        fd, tmpname = tempfile.mkstemp(suffix='.svg', dir=folder)
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                self.streamDocument(stream)
+            if isinstance(output, str):
+                mask = os.umask(0)
+                os.umask(mask)
+                os.chmod(tmpname, 0o666 & ~mask) # mkstemp makes it private
+                os.replace(tmpname, output)
+            else:
+                with open(tmpname, 'rb') as stream:
+                    shutil.copyfileobj(stream, output)
+        finally:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+
+    def streamDocument(self, stream):
+        # Writes the document for --stream. The outputs of each selected path
+        # are worked out, written and dropped before the next path is started,
+        # so that memory doesn't grow with the output. Only the node numbers are
+        # held back, as their records, because the doc layer is written last.
+        outputs, pending, layer, doc_layer = self.streaming
+        numbers = []
+        def writeElement(xf, elem):
+            # xf.write would declare the namespaces again on every element
+            if not isinstance(elem.tag, str): # a comment or processing instruction
+                xf.write(elem, with_tail=False)
+            else:
+                with xf.element(elem.tag, dict(elem.attrib), nsmap=elem.nsmap if elem is self.svg else None):
+                    if elem.text:
+                        xf.write(elem.text)
+                    for child in elem:
+                        if child is not doc_layer:
+                            writeElement(xf, child)
+                    if elem is layer:
+                        writeOutputs(xf)
+                    if elem is self.svg:
+                        writeDocLayer(xf)
+            if elem.tail:
+                xf.write(elem.tail)
+        def writeOutputs(xf):
+            scratch = Group()
+            for output in outputs:
+                elem, fingerprint = pending.popleft()
+                for record in output:
+                    if record[0] == 'doc':
+                        numbers.append((elem.get_id(), fingerprint, record))
+                self.addOutputs(elem, fingerprint, [record for record in output if record[0] != 'doc'], layer, None, scratch)
+                for child in scratch:
+                    writeElement(xf, child)
+                    xf.write("\n")
+                scratch.clear()
+        def writeDocLayer(xf):
+            with xf.element(doc_layer.tag, dict(doc_layer.attrib)):
+                if doc_layer.text:
+                    xf.write(doc_layer.text)
+                for child in doc_layer:
+                    writeElement(xf, child)
+                for eid, fingerprint, record in numbers:
+                    for te in self.add_doc(None, inkex.Vector2d(*record[1:3]), inkex.Vector2d(*record[3:5]), record[5], doc_layer):
+                        te.set(SOURCE_ATTR, eid)
+                        te.set(FINGERPRINT_ATTR, fingerprint)
+                        writeElement(xf, te)
+                        te.delete()
+            xf.write("\n")
+        with etree.xmlfile(stream, encoding='utf-8') as xf:
+            # The comments and processing instructions around the root are
+            # kept, as they are when the whole document is saved. xmlfile
+            # won't take any after the root, so those are written past it.
+            for node in reversed(list(self.svg.itersiblings(preceding=True))):
+                xf.write(node, with_tail=False)
+            writeElement(xf, self.svg)
+        for node in self.svg.itersiblings():
+            stream.write(etree.tostring(node, with_tail=False))
+        self.finishEffect()
+
+    def placeOutput(self, output, layer, doc_layer):
+        # Adds the records from elementGeometry to the document. Returns the
+        # elements added as (element, box), where box is None for the node
+        # numbers and the bounding box for the pieces (wrappers and tabbed strips)
+        pieces = []
+        for record in output:
+            if record[0] == 'doc':
+                for te in self.add_doc(None, inkex.Vector2d(*record[1:3]), inkex.Vector2d(*record[3:5]), record[5], doc_layer):
+                    pieces.append((te, None))
+            elif record[0] == 'group':
+                group = Group()
+                group.label = record[1]
+                for dstr, label, sstr in record[2]:
+                    self.drawline(dstr, label, group, sstr)
+                layer.append(group)
+                pieces.append((group, record[3]))
+            else:
+                pieces.append((self.drawline(*record[1:3], layer, record[3]), record[4]))
+        return pieces
+
+    def pieceBox(self, points):
+        # The bounding box (minx, miny, maxx, maxy) of a piece's outline
+        return tuple(float(v) for v in np.concatenate((points.min(axis=0), points.max(axis=0))))
+
+    def packSheets(self, sizes, sheetw, sheeth, spacing, rotate, maxsheets):
+        # Shelf packing (next fit, decreasing height) of pieces of the given
+        # (width, height) onto sheets. Pieces go left to right on shelves, the
+        # tallest first, spacing apart and away from the sheet edges. With
+        # rotate, a piece is turned a quarter turn to lie down, or when that is
+        # the only way it fits. Returns (sheet, x, y, turned) for each piece, or
+        # None for a piece that doesn't fit on a sheet (or on the first
+        # maxsheets sheets when maxsheets isn't 0).
+        roomw = sheetw - spacing
+        roomh = sheeth - spacing
+        placed = [None]*len(sizes)
+        laid = []
+        for pnum, (w, h) in enumerate(sizes):
+            fits = (w + spacing <= roomw) and (h + spacing <= roomh)
+            fits_turned = rotate and (h + spacing <= roomw) and (w + spacing <= roomh)
+            if fits_turned and ((not fits) or (h > w)):
+                laid.append((w, h, pnum, True))
+            elif fits:
+                laid.append((h, w, pnum, False))
+        laid.sort(key=lambda piece: -piece[0])
+        sheet = 0
+        x = y = spacing
+        shelf = 0.0
+        for h, w, pnum, turned in laid:
+            if x + w > roomw: # start a new shelf
+                x = spacing
+                y += shelf + spacing
+                shelf = 0.0
+            if y + h > roomh: # start a new sheet
+                sheet += 1
+                x = y = spacing
+                shelf = 0.0
+            if (maxsheets > 0) and (sheet >= maxsheets):
+                break
+            placed[pnum] = (sheet, x, y, turned)
+            x += w + spacing
+            shelf = max(shelf, h)
+        return placed
+
+    def packPieces(self, pieces, doc_layer, scale):
+        # Moves the pieces onto sheets laid out in a row from the page origin,
+        # the first one on the page, and outlines the sheets in doc_layer
+        sheetw = float(self.options.sheetwidth) * scale
+        sheeth = float(self.options.sheetheight) * scale
+        if math.isclose(sheetw, 0.0):
+            sheetw = self.svg.viewbox_width
+        if math.isclose(sheeth, 0.0):
+            sheeth = self.svg.viewbox_height
+        spacing = float(self.options.spacing) * scale
+        sizes = [(box[2]-box[0], box[3]-box[1]) for elem, box in pieces]
+        placed = self.packSheets(sizes, sheetw, sheeth, spacing, self.options.packrotate, self.options.sheets)
+        nsheets = 0
+        for (elem, box), place in zip(pieces, placed):
+            if place == None:
+                continue
+            sheet, x, y, turned = place
+            x += sheet*(sheetw + spacing)
+            if turned: # a quarter turn takes (minx, maxy) to the top left corner
+                elem.transform = inkex.Transform(((0.0, -1.0, x+box[3]), (1.0, 0.0, y-box[0])))
+            else:
+                elem.transform = inkex.Transform(translate=(x-box[0], y-box[1]))
+            nsheets = max(nsheets, sheet+1)
+        for oelem in self.svg.xpath('//*[@{0}]'.format(SHEET_ATTR)):
+            oelem.delete() # outlines from an earlier run
+        for sheet in range(nsheets):
+            left = sheet*(sheetw + spacing)
+            self.drawline(self.pathString(polygon=np.array([(left, 0.0), (left+sheetw, 0.0),\
+                (left+sheetw, sheeth), (left, sheeth)])), 'sheet'+str(sheet+1), doc_layer,\
+                'fill:none;stroke:#999999;stroke-width:{0:.6g}'.format(0.01*scale)).set(SHEET_ATTR, str(sheet+1))
+        unplaced = placed.count(None)
+        if unplaced > 0:
+            inkex.errormsg("{0} of {1} pieces did not fit on the sheets and were left at the origin".format(unplaced, len(pieces)))
+
+    def load_raw(self):
+        # Inkscape passes the selection as --id options, so with none there is
+        # nothing to do and no need to read the document
+        if len(self.options.ids) == 0:
+            raise inkex.AbortExtension("Nothing selected")
+        super().load_raw()
+
     def effect(self):
+        self.profile = effectProfile(bool(self.options.profile))
+        self.profile.switch('setup')
+        selected = self.svg.selection.filter(PathElement)
+        if len(selected) == 0:
+            raise inkex.AbortExtension("Nothing selected")
+        self.cache = self.openCache()
         layer = self.svg.get_current_layer()
-        doc_layer = self.svg.add(Layer.new('Layer Doc'))
+        doc_layers = self.svg.xpath('//svg:g[@inkscape:groupmode="layer"][@inkscape:label="Layer Doc"]')
+        if len(doc_layers) > 0:
+            doc_layer = doc_layers[0] # left from an earlier run
+        else:
+            doc_layer = self.svg.add(Layer.new('Layer Doc'))
         scale = self.svg.unittouu("1"+self.options.unit)
-        extrude = float(self.options.extrude) * scale
-        maxstrip = float(self.options.maxstrip) * scale
-        tab_angle = float(self.options.tabangle)
-        tab_height = float(self.options.tabheight) * scale
         dashlength = float(self.options.dashlength) * scale
         dashcolor = self.options.dashcolor
-        lines_on_wrapper = self.options.linesonwrapper
-        extrude_it = self.options.extrudeit
-        sstr = None
-        
-        scorestr = {'stroke':dashcolor,'stroke-width':'0.25','fill':'#eeeeee'}  #change SMZ
-        npaths = []
-        elems = []
-        for selem in self.svg.selection.filter(PathElement):
-            elems.append(copy.deepcopy(selem))
-        if len(elems) == 0:
-            raise inkex.AbortExtension("Nothing selected")
-        for elem in elems:
-            escale = 1.0
-            backend = elem.copy() # Make a copy of it
-            backend.label = elem.get_id()+'-copy'
-            layer.append(backend)
-            npaths.clear()
-            #inkex.utils.debug(elem.attrib)
-            if 'transform' in elem.attrib:
-                transforms = elem.attrib['transform'].split()
-                for tf in transforms:
-                    if tf.startswith('scale'):
-                        escale = float(tf.split('(')[1].split(')')[0])
-                if 'style' in elem.attrib:
-                    lsstr = elem.attrib['style'].split(';')
-                    for stoken in range(len(lsstr)):
-                        if lsstr[stoken].startswith('stroke-width'):
-                            swt = lsstr[stoken].split(':')[1]
-                            if not swt[2:].isalpha(): # is value expressed in units (e.g. px)?
-                                swf = str(float(swt)*escale) # no. scale it
-                                lsstr[stoken] = lsstr[stoken].replace(swt, swf)
-                        if lsstr[stoken].startswith('stroke-miterlimit'):
-                            swt = lsstr[stoken].split(':')[1]
-                            if not swt[2:].isalpha(): # is value expressed in units (e.g. px)?
-                                swf = str(float(swt)*escale) # no. scale it
-                                lsstr[stoken] = lsstr[stoken].replace(swt, swf)
-                    sstr = ";".join(lsstr)
-                else:
-                    sstr = None
-                elem.apply_transform()
-            last_letter = 'Z'
-            savid = elem.get_id()
-            idmod = 0
-            for ptoken in elem.path.to_absolute(): # For each point in the path
-                if ptoken.letter == 'M': # Starting point
-                    # Hold this point in case we receive a Z
-                    ptx1 = mx = ptoken.x
-                    pty1 = my = ptoken.y
-                    '''
-                    Assign a structure to the new path. We assume that there is
-                    only one path and, therefore, it isn't enclosed by a
-                    sub-path. However, we'll suffix the ID, if we find a
-                    sub-path.
-                    '''
-                    npath = pathStruct()
-                    npath.enclosed = False
-                    npath.id = elem.get_id()+"-"+str(idmod)
-                    if sstr == None:
-                        if 'style' in elem.attrib:
-                            npath.style = elem.attrib['style']
-                    else:
-                        npath.style = sstr
-                    idmod += 1
-                    npath.path.extend([Move(ptx1,pty1)])
-                else:
-                    if last_letter != 'M':
-                        ptx1 = ptx2
-                        pty1 = pty2
-                    if ptoken.letter == 'L':
-                        ptx2 = ptoken.x
-                        pty2 = ptoken.y
-                    elif ptoken.letter == 'H':
-                        ptx2 = ptoken.x
-                        pty2 = pty1
-                    elif ptoken.letter == 'V':
-                        ptx2 = ptx1
-                        pty2 = ptoken.y
-                    elif ptoken.letter == 'Z':
-                        ptx2 = mx
-                        pty2 = my
-                    else:
-                        raise inkex.AbortExtension("Unrecognized path command {0}".format(ptoken.letter))
-                    npath.path.extend([Line(ptx2,pty2)])
-                    if ptoken.letter == 'Z' or ((ptx2 == mx) and (pty2 == my)):
-                        npaths.append(npath)
-                last_letter = ptoken.letter
-            # check for cutouts
-            if idmod > 1:
-                for apath in npaths: # We test these paths to see if they are fully enclosed
-                    for bpath in npaths: # by these paths
-                        if self.pathInsidePath(bpath.path, apath.path):
-                            apath.enclosed = True
-            for opath in npaths:
-                if (extrude_it == 'both') or (((extrude_it == 'cutouts') and (opath.enclosed)) or ((extrude_it == 'outline') and (not opath.enclosed))):
-                    # create the extruded path
-                    xpos = ypos = 0.0
-                    segs = pathStruct()
-                    segs.enclosed = False
-                    segs.id = opath.id+"x"
-                    strips = [] # Stores segs. Needed because a single strip might be larger than the paper
-                    scores = [] # holds lists of individual score lines per strip
-                    score = Path() # holds the combined paths individual score lines
-                    sl = None
-                    # create left edge of path for each segment
-                    for jnode in range(0,len(opath.path)-1):
-                        if jnode == 0:
-                            # Let's draw the first two node numbers to show the starting point and direction
-                            self.add_doc(opath.path, opath.path[jnode], opath.path[jnode+1], 0.5*tab_height, doc_layer)
-                            segs.path.extend([Move(xpos,ypos)]) # store the first point as a Move command
-                        # calculate length of segment between jnode and jnode+1
-                        seglength = math.sqrt((opath.path[jnode].x - opath.path[jnode+1].x)**2 + (opath.path[jnode].y - opath.path[jnode+1].y)**2)
-                        if ypos + seglength + tab_height >= maxstrip:
-                            # have to cut it at last segment
-                            strips.append(copy.deepcopy(segs))
-                            segs = pathStruct() # start a new segment
-                            segs.enclosed = False
-                            segs.id = opath.id+"x"
-                            ypos = 0
-                            scores.append(score.copy())
-                            score=Path()
-                            segs.path.extend([Move(xpos,ypos)])
-                        else:
-                            if sl != None:
-                                score.extend(sl) # add the horizontal scoreline for the previous point
-                        ypos = ypos + seglength
-                        segs.path.extend([Line(xpos,ypos)]) # store the rest as Line commands
-                        if jnode < len(opath.path)-2:
-                            # Generate score lines across extrusion (except for last one)
-                            sl = self.makescore(Move(xpos,ypos), Move(extrude, ypos),dashlength)
-                    strips.append(copy.deepcopy(segs))
-                    scores.append(score.copy())
-                    # create right edge of path for each segment
-                    for knode in range(len(strips)):
-                        rsegs = strips[knode].path.reverse().copy() # reverse path and copy it to resegs
-                        for jnode in range(0,len(rsegs)):
-                            if jnode == 0:
-                                # Replace the Move command with a Line command
-                                mx = rsegs[0].x
-                                my = rsegs[0].y
-                                del rsegs[0]
-                                rsegs.insert(0, Line(mx,my))
-                            linx = extrude
-                            liny = rsegs[jnode].y
-                            rsegs[jnode] = Line(linx,liny)
-                        strips[knode].path += rsegs # combine it with left edge of segment
-                        strips[knode].path.extend([ZoneClose()]) # and close the path
-                    if opath.style != None:
-                        sstr = opath.style
-                    # Generate the wrappers from the extruded paths
-                    for stripcnt in range(len(strips)):
-                        if math.isclose(dashlength, 0.0) and (len(scores[stripcnt]) > 0):                              
-                            if lines_on_wrapper:
-                                group = Group()
-                                group.label = 'g'+opath.id+'ws'+str(stripcnt)
-                                self.drawline(str(strips[stripcnt].path),'wrapper'+str(stripcnt),group,sstr) # Output the model
-                                self.drawline(str(scores[stripcnt]),'score'+str(stripcnt)+'w',group,scorestr) # Output the scorelines separately
-                                layer.append(group)
-                            else:
-                                self.drawline(str(strips[stripcnt].path),'wrapper'+str(stripcnt),layer,sstr) # Output the model
-                        else:
-                            if (len(scores[stripcnt]) > 0) and lines_on_wrapper:
-                                self.drawline(str(scores[stripcnt]+strips[stripcnt].path),opath.id+'ws'+str(stripcnt),layer,sstr)
-                            else:
-                                self.drawline(str(strips[stripcnt].path),opath.id+'w'+str(stripcnt),layer,sstr)
-                    # Generate the tabbed strips from the extruded paths
-                    for stripcnt in range(len(strips)):
-                        strip = strips[stripcnt]
-                        mpath = Path()
-                        score = Path()
-                        for ptn in range(len(strip.path)-2):
-                            if ptn == 0:
-                                mpath.extend([strip.path[0]])
-                            tabpt1, tabpt2 = self.makeTab(strip, strip.path[ptn], strip.path[ptn+1], tab_height, tab_angle)
-                            mpath.extend([tabpt1])
-                            mpath.extend([tabpt2])
-                            mpath.extend([strip.path[ptn+1]])
-                            score.extend(self.makescore(strip.path[ptn], strip.path[ptn+1],dashlength))
-                        scores[stripcnt].extend(score.copy())
-                        mpath.extend([ZoneClose()])
-                        if math.isclose(dashlength, 0.0) and (len(scores[stripcnt]) > 0):
-                            group = Group()
-                            group.label = 'g'+opath.id+'ms'+str(stripcnt)
-                            self.drawline(mpath,'model'+str(stripcnt),group,sstr) # Output the model
-                            self.drawline(str(scores[stripcnt]),'score'+str(stripcnt)+'m',group,scorestr) # Output the scorelines separately
-                            layer.append(group)
-                        else:
-                            if len(scores[stripcnt]) > 0:
-                                self.drawline(str(scores[stripcnt]+mpath),opath.id+'ms'+str(stripcnt),layer,sstr)
-                            else:
-                                self.drawline(str(mpath),opath.id+'m'+str(stripcnt),layer,sstr)
+        geom = {
+            'extrude': float(self.options.extrude) * scale,
+            'maxstrip': float(self.options.maxstrip) * scale,
+            'tabangle': float(self.options.tabangle),
+            'tabheight': float(self.options.tabheight) * scale,
+            'dashlength': dashlength,
+            'linesonwrapper': self.options.linesonwrapper,
+            # Native dashes are single lines styled with stroke-dasharray, so like solid
+            # lines they need their own element instead of sharing the model's path
+            'nativedash': (not math.isclose(dashlength, 0.0)) and (self.options.dashmode == 'native'),
+            'extrudeit': self.options.extrudeit,
+            'splitmode': self.options.splitmode,
+            'flatness': float(self.options.flatness) * scale,
+            'simplify': (float(self.options.simplifytol) * scale) if self.options.simplify else None,
+            'scorestr': {'stroke':dashcolor,'stroke-width':'0.25','fill':'#eeeeee'}  #change SMZ
+        }
+        # Outputs of an earlier run are tagged with the id of the path they came
+        # from and a fingerprint of it, so that only the paths that changed
+        # since are worked out again, and their outputs replaced
+        previous = self.previousOutputs()
+        if self.options.stream:
+            # Streamed outputs can't be put where the old ones are, so the old
+            # ones are dropped and every selected path is worked out again
+            if self.options.pack:
+                raise inkex.AbortExtension("Strips can't be laid out on sheets when the output is streamed")
+            for elem in selected:
+                for oelem in previous.pop(elem.get_id(), []):
+                    oelem.delete()
+        pending = collections.deque()
+        def jobs():
+            for elem, fingerprint, epath, sstr in self.selectedPaths(geom, previous):
+                pending.append((elem, fingerprint))
+                yield elem.get_id(), epath, sstr
+        if (self.options.workers > 1) and (len(selected) > 1):
+            outputs = self.workerOutputs(jobs(), geom, len(selected))
+        else:
+            outputs = (self.elementGeometry(eid, epath, sstr, geom) for eid, epath, sstr in jobs())
+        if self.options.stream:
+            # save_raw works the paths out as it writes the document
+            self.streaming = (outputs, pending, layer, doc_layer)
+            return
+        pieces = []
+        redone = set()
+        for output in outputs:
+            elem, fingerprint = pending.popleft()
+            placed = self.addOutputs(elem, fingerprint, output, layer, doc_layer)
+            pieces.extend((nelem, box) for nelem, box in placed if box != None)
+            old = previous.get(elem.get_id(), [])
+            if len(old) > 0:
+                self.replaceOutputs(old, [nelem for nelem, box in placed], doc_layer)
+            redone.add(elem.get_id())
+        if self.options.pack:
+            # The pieces left from an earlier run are packed along with the new ones
+            for elem in selected:
+                if elem.get_id() not in redone:
+                    for oelem in previous.get(elem.get_id(), []):
+                        if oelem.get(BOX_ATTR) != None:
+                            pieces.append((oelem, tuple(float(v) for v in oelem.get(BOX_ATTR).split())))
+            self.profile.switch('sheet packing')
+            self.packPieces(pieces, doc_layer, scale)
+        self.finishEffect()
+
+    def finishEffect(self):
+        # What is left to do once all the selected paths are worked out
+        if self.cache != None:
+            self.profile.switch('result cache')
+            self.cache.evict()
+        if self.options.simplify:
+            inkex.errormsg("Simplifying removed {0} of {1} nodes".format(self.profile.counters.get('nodes removed', 0),\
+                self.profile.counters.get('nodes before simplification', 0)))
+
+def elementWorker(work):
+    # Extruder.elementGeometry in a worker process. work is (job, geom, options),
+    # where options holds the few options that the geometry reads. Returns the
+    # output and the profile counters.
+    (eid, path, style), geom, options = work
+    ext = Extruder()
+    ext.options = options
+    ext.profile = effectProfile(bool(options.profile))
+    ext.cache = ext.openCache()
+    return ext.elementGeometry(eid, path, style, geom), ext.profile.counters
 
+def elementBatch(works):
+    # elementWorker on a few jobs at once, to spare the trips to the worker
+    return [elementWorker(work) for work in works]
 
 if __name__ == '__main__':
     Extruder().run()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright (C) [2021] [Joseph Zakar], [observing@gmail.com]
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+Runs the Extruder effect outside of Inkscape on many SVG files at once. Every
+path in a file is extruded, and the result is written next to the input file.
+Files are spread over a pool of worker processes.
+
+    python extruderz_batch.py [--jobs N] [--suffix -extruded] [extruder options] FILE|DIR|GLOB ...
+
+The extruder options are the ones the extension takes (--extrude, --maxstrip,
+--tabheight, ...). A directory stands for all the .svg files in it. For very
+large outputs, --stream=true writes each file as its paths are worked out
+instead of building the whole document in memory first.
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+import inkex
+from inkex import PathElement
+
+from extruderz import Extruder
+
+def findFiles(sources, suffix):
+    # Expands the command line sources into a sorted list of SVG files,
+    # leaving out earlier outputs
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            found = glob.glob(os.path.join(source, '*.svg'))
+        elif glob.has_magic(source):
+            found = glob.glob(source)
+        else:
+            found = [source]
+        for fname in sorted(found):
+            if os.path.splitext(fname)[0].endswith(suffix):
+                continue
+            if fname not in files:
+                files.append(fname)
+    return files
+
+def outputName(infile, suffix):
+    root, ext = os.path.splitext(infile)
+    return root + suffix + ext
+
+def pathIds(infile):
+    # The ids of all the drawn paths in the file (not the ones in defs)
+    svg = inkex.load_svg(infile).getroot()
+    if svg is None:
+        raise inkex.AbortExtension("Not an SVG file")
+    ids = []
+    for elem in svg.descendants().filter(PathElement):
+        if not elem.ancestors().filter(inkex.Defs):
+            ids.append(elem.get_id())
+    return ids
+
+def extrudeFile(infile, outfile, args):
+    # Runs the effect on one file. Errors are returned rather than raised so
+    # that one bad file doesn't stop the batch.
+    # Returns (infile, outfile, error message or None, seconds taken)
+    start = time.perf_counter()
+    error = None
+    stderr = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(stderr):
+            ids = pathIds(infile)
+            if len(ids) == 0:
+                raise inkex.AbortExtension("No paths found")
+            Extruder().run(args + ['--id='+pid for pid in ids] + [infile], output=outfile)
+    except SystemExit:
+        # Extruder.run reports an AbortExtension on stderr and exits
+        error = stderr.getvalue().strip() or "Aborted"
+    except Exception as err:
+        error = "{0}: {1}".format(type(err).__name__, err)
+    return infile, outfile, error, time.perf_counter() - start
+
+def extruderArgs(options, extruder_pars):
+    # Turns the parsed extruder options back into arguments for Extruder.run
+    args = []
+    for action in extruder_pars._actions:
+        if not action.option_strings:
+            continue
+        value = getattr(options, action.dest)
+        if value is not None:
+            args.append('{0}={1}'.format(action.option_strings[0], value))
+    return args
+
+def main(argv=None):
+    extruder_pars = argparse.ArgumentParser(add_help=False)
+    Extruder().add_arguments(extruder_pars)
+    pars = argparse.ArgumentParser(description="Extrude every path in many SVG files",\
+        parents=[extruder_pars])
+    pars.add_argument("sources", nargs='+',\
+        help="SVG files, directories or glob patterns")
+    pars.add_argument("--jobs", type=int, default=os.cpu_count(),\
+        help="Number of worker processes")
+    pars.add_argument("--suffix", default="-extruded",\
+        help="Added to the input file name to name the output file")
+    options = pars.parse_args(argv)
+    files = findFiles(options.sources, options.suffix)
+    if len(files) == 0:
+        pars.error("no SVG files found")
+    args = extruderArgs(options, extruder_pars)
+    jobs = max(1, min(options.jobs, len(files)))
+    start = time.perf_counter()
+    failed = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = [pool.submit(extrudeFile, infile, outputName(infile, options.suffix), args) for infile in files]
+        for result in results:
+            infile, outfile, error, seconds = result.result()
+            if error is None:
+                print("{0} -> {1} ({2:.2f}s)".format(infile, outfile, seconds))
+            else:
+                failed.append(infile)
+                print("{0}: FAILED: {1}".format(infile, error), file=sys.stderr)
+    print("Extruded {0} of {1} files in {2:.2f}s using {3} processes".format(\
+        len(files)-len(failed), len(files), time.perf_counter()-start, jobs))
+    if failed:
+        print("Failed: " + ", ".join(failed), file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright (C) [2021] [Joseph Zakar], [observing@gmail.com]
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+Checks of the geometry library (extrudergeom) against slow but plain
+versions of the same work. Run with pytest from the beta folder:
+
+    python -m pytest tests
+"""
+
+import math
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extrudergeom
+
+def greedyStrips(seglengths, room, first):
+    # Strips filled as far as they go from the position first along the
+    # edges: up to room when that is partway along an edge longer than room,
+    # else up to the last node that fits. Returns the positions where the
+    # strips end.
+    total = sum(seglengths)
+    nodes = [0.0]
+    for seglength in 3*seglengths:
+        nodes.append(nodes[-1] + seglength)
+    pos = first
+    bounds = []
+    while pos < first + total - 1e-9:
+        reach = pos + room
+        end = pos
+        for n, seglength in enumerate(3*seglengths):
+            if nodes[n] <= reach + 1e-9:
+                end = nodes[n]
+                if (seglength > room) and (reach < nodes[n+1]):
+                    end = max(end, reach)
+        pos = end
+        bounds.append(pos)
+    return bounds
+
+def fewestStrips(seglengths, room):
+    # The fewest strips found by filling strips from every node and from
+    # many points along the edges that may be cut
+    nodes = [0.0]
+    for seglength in seglengths:
+        nodes.append(nodes[-1] + seglength)
+    firsts = nodes[:-1]
+    for n, seglength in enumerate(seglengths):
+        if seglength > room:
+            firsts.extend(nodes[n] + seglength*k/40.0 for k in range(1, 40))
+    return min(len(greedyStrips(seglengths, room, first)) for first in firsts)
+
+def randomLoops(count, seed=1):
+    # Edge loops with a good share of edges longer than a strip, and the room
+    # in a strip for them
+    rand = random.Random(seed)
+    for _ in range(count):
+        room = rand.uniform(1.0, 20.0)
+        yield [rand.uniform(0.05, 2.5)*room for _ in range(rand.randint(2, 9))], room
+
+def checkStrips(seglengths, room, start, ystrips):
+    # The strips are no longer than room and cover the edges once from the
+    # node start. They end on nodes or partway along edges longer than room,
+    # and have only nodes (folds) in between
+    nodes = [0.0]
+    for seglength in seglengths[start:] + seglengths[:start]:
+        nodes.append(nodes[-1] + seglength)
+    longs = [(a, b) for a, b in zip(nodes, nodes[1:]) if b - a > room]
+    pos = 0.0
+    for ypos, folds in ystrips:
+        assert ypos[-1] <= room + 1e-9
+        assert (len(folds) == len(ypos) - 2) and all(folds)
+        for y in ypos[1:-1]:
+            assert min(abs(pos + y - node) for node in nodes) < 1e-7
+        pos += ypos[-1]
+        onNode = min(abs(pos - node) for node in nodes) < 1e-7
+        assert onNode or any(a < pos < b for a, b in longs)
+    assert math.isclose(pos, sum(seglengths))
+
+def test_split_examples():
+    # The long edge is cut where the first strip runs out
+    start, ystrips = extrudergeom.splitStrips([3.2137, 2.3991, 17.6563], 12.8626, 'fewest')
+    assert len(ystrips) == 2
+    checkStrips([3.2137, 2.3991, 17.6563], 12.8626, start, ystrips)
+    # 56 in all fits in 3 strips of 20, with the long edge cut twice
+    start, ystrips = extrudergeom.splitStrips([50.0, 2.0, 2.0, 2.0], 20.0, 'fewest')
+    assert len(ystrips) == 3
+    checkStrips([50.0, 2.0, 2.0, 2.0], 20.0, start, ystrips)
+
+def test_split_fewest_matches_brute_force():
+    for seglengths, room in randomLoops(1000):
+        best = fewestStrips(seglengths, room)
+        assert best >= math.ceil(sum(seglengths)/room - 1e-9)
+        for splitmode in ['fewest', 'balanced']:
+            start, ystrips = extrudergeom.splitStrips(seglengths, room, splitmode)
+            assert len(ystrips) == best, (seglengths, room, splitmode)
+            checkStrips(seglengths, room, start, ystrips)
+
+def allCollisions(outline, tabs):
+    # tabCollisions without the sweep: every side of every tab against every
+    # other tab side and edge of the polygon
+    owner = [-1]*len(outline)
+    segs = list(np.column_stack((outline, np.roll(outline, -1, axis=0))))
+    for t, (pt1, pt2, tab) in enumerate(zip(outline[:-1], outline[1:], tabs)):
+        owner.extend([t, t, t])
+        segs.extend([np.concatenate((pt1, tab[0:2])), tab, np.concatenate((tab[2:4], pt2))])
+    segs = np.array(segs)
+    i, j = np.triu_indices(len(segs), 1)
+    cross = extrudergeom.segmentsCross(segs[i], segs[j], 1e-9*max(1.0, float(np.abs(segs).max())))
+    collide = np.zeros(len(tabs), dtype=bool)
+    for a, b in zip(i[cross], j[cross]):
+        if owner[a] != owner[b]:
+            collide[[c for c in (owner[a], owner[b]) if c >= 0]] = True
+    return collide
+
+def slotOutline():
+    # A U with a slot 20 wide, so that tabs 30 high on the walls of the slot
+    # cross each other
+    return np.array([(0.0,0.0), (100.0,0.0), (100.0,100.0), (60.0,100.0), (60.0,20.0),\
+        (40.0,20.0), (40.0,100.0), (0.0,100.0)])
+
+def test_tabs_collide_in_slot():
+    outline = slotOutline()
+    tabs = extrudergeom.makeTabs(outline, 30.0, 45.0)
+    assert not extrudergeom.tabsApart(outline, tabs)
+    collide = extrudergeom.tabCollisions(outline, tabs)
+    assert collide[[3, 5]].all()
+    assert (collide == allCollisions(outline, tabs)).all()
+    counters = {}
+    shrunk = extrudergeom.shrinkCollidingTabs(outline, tabs.copy(), counters)
+    assert not extrudergeom.tabCollisions(outline, shrunk).any()
+    assert counters['tab collisions'] == np.count_nonzero(collide)
+    assert np.allclose(shrunk[~collide], tabs[~collide])
+
+def test_strip_tabs_apart():
+    rand = random.Random(2)
+    for _ in range(200):
+        ypos = np.cumsum([0.0] + [rand.uniform(0.01, 50.0) for _ in range(rand.randint(1, 40))])
+        outline = extrudergeom.stripOutline(ypos, rand.uniform(5.0, 100.0))
+        tabs = extrudergeom.makeTabs(outline, rand.uniform(0.1, 200.0), rand.uniform(1.0, 89.0))
+        assert extrudergeom.tabsApart(outline, tabs)
+        assert not allCollisions(outline, tabs).any()
+
+def test_tab_collisions_match_all_pairs():
+    rand = random.Random(3)
+    for _ in range(300):
+        angles = np.sort([rand.uniform(0.0, 2*math.pi) for _ in range(rand.randint(3, 12))])
+        radii = np.array([rand.uniform(20.0, 100.0) for _ in angles])
+        outline = np.column_stack((radii*np.cos(angles), radii*np.sin(angles)))
+        tabs = extrudergeom.makeTabs(outline, rand.uniform(1.0, 60.0), rand.uniform(1.0, 89.0))
+        assert (extrudergeom.tabCollisions(outline, tabs) == allCollisions(outline, tabs)).all()
+
+def test_extrude_ring_needs_three_points():
+    for points in [[], [(1.0,2.0)], [(0.0,0.0), (5.0,0.0)], [(0.0,0.0), (5.0,0.0), (0.0,0.0), (5.0,0.0)]]:
+        with pytest.raises(ValueError):
+            extrudergeom.extrudeRing(points, extrude=1.0)
+    start, strips = extrudergeom.extrudeRing([(0.0,0.0), (5.0,0.0), (0.0,3.0)], extrude=1.0, maxstrip=20.0)
+    assert len(strips) == 1
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright (C) [2021] [Joseph Zakar], [observing@gmail.com]
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+Checks of whole runs of the extension (extruderz) on small documents. Run
+with pytest from the beta folder:
+
+    python -m pytest tests
+"""
+
+import io
+import os
+import sys
+
+import inkex
+import numpy as np
+from lxml import etree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extruderz
+
+# The current layer has a transform of its own, and holds a path in a
+# transformed group
+TRANSFORMED_LAYER = b"""<svg xmlns="http://www.w3.org/2000/svg" xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape" xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd" width="8.5in" height="11in" viewBox="0 0 816 1056">
+<sodipodi:namedview id="namedview1" inkscape:current-layer="layer1"/>
+<g inkscape:groupmode="layer" id="layer1" transform="translate(0,50)">
+<g id="g1" transform="translate(50,20) rotate(30)">
+<path id="q1" transform="matrix(2,0.3,0,1.5,5,5)" d="M 10,10 h 50 v 30 A 20 20 0 0 1 10 40 Z" style="stroke:#000000;stroke-width:1px;fill:none"/>
+</g>
+<path id="q2" d="M 300,300 h 80 v 60 h -80 Z" style="stroke:#000000;stroke-width:1px;fill:none"/>
+</g></svg>"""
+
+def runExtruder(document, *args):
+    # The document the extension writes for the selected paths q1 and q2 of
+    # the file document
+    output = io.BytesIO()
+    extruderz.Extruder().run(list(args) + ['--id=q1', '--id=q2', str(document)], output=output)
+    return etree.fromstring(output.getvalue())
+
+def composedTransform(elem):
+    # The transform of an element and of all the groups it is in
+    transform = inkex.Transform()
+    while elem is not None:
+        transform = inkex.Transform(elem.get('transform')) @ transform
+        elem = elem.getparent()
+    return transform
+
+def placedCopies(root):
+    # The composed transform of each copy of a selected path, by the id of
+    # the path it was copied from
+    copies = {}
+    for elem in root.iter():
+        if isinstance(elem.tag, str) and (elem.get(extruderz.SOURCE_ATTR) != None) and\
+                elem.get(inkex.addNS('label', 'inkscape'), '').endswith('-copy'):
+            copies[elem.get(extruderz.SOURCE_ATTR)] = composedTransform(elem)
+    return copies
+
+def test_stream_keeps_copies_in_place(tmp_path):
+    # The copies go where the paths are, streamed or not, even though the
+    # layer they are added to has a transform
+    document = tmp_path / 'layer.svg'
+    document.write_bytes(TRANSFORMED_LAYER)
+    whole = placedCopies(runExtruder(document))
+    streamed = placedCopies(runExtruder(document, '--stream=true'))
+    source = etree.fromstring(TRANSFORMED_LAYER)
+    assert sorted(whole) == sorted(streamed) == ['q1', 'q2']
+    for eid in ['q1', 'q2']:
+        transform = composedTransform(source.find('.//*[@id="%s"]' % eid))
+        assert np.allclose(whole[eid].matrix, transform.matrix), eid
+        assert np.allclose(streamed[eid].matrix, transform.matrix), eid